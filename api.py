@@ -1,13 +1,18 @@
 import uvicorn
+import asyncio
+import hashlib
+import itertools
 import logging
 import sys
 import os
-import fastapi
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, BackgroundTasks
-from fastapi.responses import StreamingResponse, FileResponse, JSONResponse
+import struct
+import time
+from fastapi import FastAPI, Depends, HTTPException, Request, UploadFile, File
+from fastapi.responses import Response, StreamingResponse, FileResponse, JSONResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from typing import AsyncGenerator
 
 # Configure logging
 logging.basicConfig(
@@ -17,11 +22,14 @@ logging.basicConfig(
 
 # Import our services
 from services.models import model_service, ModelService
-from services.tts import tts_service, TTSService
+from services.tts import tts_service, TTSService, CachedTTSService, LRUBytesCache, wav_header, streaming_wav_header
 from services.generator import FrameGenerationService, EnhancedFrameGenerationService
 from config import settings
 
-app = FastAPI(title="SyncTalk_2D API")
+app = FastAPI(title="SyncTalk_2D API", default_response_class=ORJSONResponse)
+
+# Serialized WAV files for /get-tts-audio, keyed by the TTS cache key
+wav_cache = LRUBytesCache(settings.tts.cache_max_bytes)
 
 # Add CORS middleware to allow frontend requests
 app.add_middleware(
@@ -45,17 +53,32 @@ async def service_error_handler(request, exc):
         }
     )
 
+# Health probe state: synthesis is only re-checked every HEALTH_PROBE_INTERVAL seconds
+HEALTH_PROBE_INTERVAL = 30.0
+_last_probe_time = float("-inf")
+_last_probe_status = "ok"
+
 # Add health check endpoint
 @app.get("/health")
 async def health_check():
-    # Check if TTS is working by attempting to synthesize a very short text
-    tts_status = "ok"
-    try:
-        test_audio = tts_service.synthesize("test")
-        if not test_audio or len(test_audio) < 100:
-            tts_status = "fallback"
-    except:
-        tts_status = "error"
+    global _last_probe_time, _last_probe_status
+    
+    # Readiness flags are free; only synthesize a probe when the cached result is stale
+    if not tts_service.is_ready():
+        tts_status = "fallback"
+    elif time.monotonic() - _last_probe_time < HEALTH_PROBE_INTERVAL:
+        tts_status = _last_probe_status
+    else:
+        tts_status = "ok"
+        try:
+            # Run off the event loop so a slow probe doesn't stall streaming requests
+            test_audio = await asyncio.to_thread(tts_service.synthesize, "test")
+            if not test_audio or len(test_audio) < 100:
+                tts_status = "fallback"
+        except Exception:
+            tts_status = "error"
+        _last_probe_time = time.monotonic()
+        _last_probe_status = tts_status
     
     health = {
         "status": "ok" if tts_status == "ok" else "degraded",
@@ -64,11 +87,11 @@ async def health_check():
             "model": "ok"  # Assume model service is ok for simplicity
         }
     }
-    return health
+    return ORJSONResponse(content=health)
 
 # --- Dependency Injection ---
-# This function will be called for each request to get the generator service
-def get_generator_service():
+def create_generator_service() -> FrameGenerationService:
+    """Create the frame generation service, preferring the enhanced head-motion version."""
     # Use the enhanced generator service for better animation quality
     try:
         # First try to use the enhanced service with head motion
@@ -78,6 +101,79 @@ def get_generator_service():
         # Fall back to the original service if enhanced service fails
         return FrameGenerationService(model_service, tts_service)
 
+# Built once at startup: loading the head-motion source frames is expensive, and the
+# service keeps all per-request state (frame index, head-motion phase) in local variables
+generator_service = create_generator_service()
+
+# This function will be called for each request to get the generator service
+def get_generator_service() -> FrameGenerationService:
+    return generator_service
+
+# --- Streaming ---
+# Frames queued ahead of the socket, and the most bytes coalesced into a single send
+STREAM_QUEUE_FRAMES = 8
+STREAM_BATCH_BYTES = 64 * 1024
+
+_STREAM_END = object()
+
+async def batched_stream(
+    frames: AsyncGenerator[bytes, None],
+    max_batch_bytes: int = STREAM_BATCH_BYTES
+) -> AsyncGenerator[bytes, None]:
+    """
+    Relay multipart frames through a bounded queue, coalescing queued frames per send.
+    
+    Frame generation runs as a separate task so it never waits on the socket. Each
+    ASGI send takes every frame already waiting in the queue (up to max_batch_bytes),
+    which cuts per-frame send overhead without adding latency: a lone ready frame
+    is sent immediately.
+    
+    Args:
+        frames: Async generator of multipart-framed JPEG bytes
+        max_batch_bytes: Soft limit on the size of one coalesced chunk
+        
+    Yields:
+        bytes: One or more concatenated frames
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_FRAMES)
+    
+    async def produce():
+        try:
+            async for frame in frames:
+                await queue.put(frame)
+            await queue.put(_STREAM_END)
+        except Exception as e:
+            await queue.put(e)
+    
+    producer = asyncio.create_task(produce())
+    try:
+        finished = False
+        while not finished:
+            item = await queue.get()
+            parts = []
+            size = 0
+            error = None
+            while True:
+                if item is _STREAM_END:
+                    finished = True
+                    break
+                if isinstance(item, Exception):
+                    error = item
+                    break
+                parts.append(item)
+                size += len(item)
+                if size >= max_batch_bytes or queue.empty():
+                    break
+                item = queue.get_nowait()
+            
+            if parts:
+                yield parts[0] if len(parts) == 1 else b"".join(parts)
+            if error is not None:
+                raise error
+    finally:
+        # Stop generating if the client disconnected mid-stream
+        producer.cancel()
+
 # Request model for text-to-speech generation
 class TextRequest(BaseModel):
     text: str
@@ -99,13 +195,8 @@ async def generate(
     Returns:
         StreamingResponse: A stream of JPEG frames
     """
-    # Make sure we're properly handling the async generator
-    async def stream_generator():
-        async for frame in generator.generate_frames(text, audio_duration=duration):
-            yield frame
-            
     return StreamingResponse(
-        stream_generator(),
+        batched_stream(generator.generate_frames(text, audio_duration=duration)),
         media_type='multipart/x-mixed-replace; boundary=frame'
     )
 
@@ -126,36 +217,94 @@ async def generate_post(
     Returns:
         StreamingResponse: A stream of JPEG frames
     """
-    # Make sure we're properly handling the async generator
-    async def stream_generator():
-        async for frame in generator.generate_frames(request.text, audio_duration=duration):
-            yield frame
-            
     return StreamingResponse(
-        stream_generator(),
+        batched_stream(generator.generate_frames(request.text, audio_duration=duration)),
         media_type='multipart/x-mixed-replace; boundary=frame'
     )
 
+# The avatar is the static template frame, fixed for the lifetime of the deployment.
+# It is memory-mapped from disk so all workers share a single copy.
+avatar_jpeg = generator_service.share_static_jpeg()
+avatar_etag = f'"{hashlib.sha1(avatar_jpeg).hexdigest()}"'
+
 @app.get("/avatar")
-async def avatar(
-    generator: FrameGenerationService = Depends(get_generator_service)
-):
+async def avatar(request: Request) -> Response:
     """
     Return a static avatar frame.
     
+    The frame is served as a plain cacheable JPEG with an ETag, so browsers
+    revalidate with If-None-Match and get an empty 304 instead of the image.
+    
     Args:
-        generator: Frame generation service (injected)
+        request: The incoming request (for the If-None-Match header)
         
     Returns:
-        StreamingResponse: A static JPEG frame of the avatar
+        Response: The avatar JPEG, or 304 Not Modified
     """
-    async def frame_generator():
-        yield await generator.generate_static_frame()
+    headers = {
+        "ETag": avatar_etag,
+        "Cache-Control": "public, max-age=3600"
+    }
+    if request.headers.get("if-none-match") == avatar_etag:
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=avatar_jpeg, media_type="image/jpeg", headers=headers)
+
+async def read_wav_upload(audio_file: UploadFile) -> bytes:
+    """
+    Validate an uploaded WAV file from its header and return its PCM samples.
+    
+    Only the RIFF header and chunk headers are read before validation, so files
+    in the wrong format are rejected without buffering their audio. The WAV
+    header itself is not returned, so it is never decoded as samples.
+    
+    Args:
+        audio_file: The uploaded file
         
-    return StreamingResponse(
-        frame_generator(),
-        media_type='multipart/x-mixed-replace; boundary=frame'
-    )
+    Returns:
+        bytes: The raw 16-bit mono PCM samples from the data chunk
+        
+    Raises:
+        ValueError: If the file is not 16-bit mono PCM WAV at 16kHz, or is empty
+    """
+    riff = await audio_file.read(12)
+    if len(riff) < 12:
+        raise ValueError("Audio file appears to be empty or corrupted")
+    riff_id, _, wave_id = struct.unpack('<4sI4s', riff)
+    if riff_id != b'RIFF' or wave_id != b'WAVE':
+        raise ValueError("Audio file is not a valid WAV file")
+    
+    has_fmt = False
+    while True:
+        chunk_header = await audio_file.read(8)
+        if len(chunk_header) < 8:
+            raise ValueError("WAV file has no audio data")
+        chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+        # Chunks are padded to an even number of bytes
+        padded_size = chunk_size + (chunk_size & 1)
+        
+        if chunk_id == b'fmt ':
+            fmt = await audio_file.read(padded_size)
+            if len(fmt) < 16:
+                raise ValueError("Audio file appears to be empty or corrupted")
+            audio_format, channels, sample_rate, _, _, bits = struct.unpack('<HHIIHH', fmt[:16])
+            if audio_format != 1 or channels != 1 or bits != 16 or sample_rate != 16000:
+                raise ValueError(
+                    f"Audio must be 16-bit mono PCM at 16kHz "
+                    f"(got format={audio_format}, channels={channels}, bits={bits}, rate={sample_rate})"
+                )
+            has_fmt = True
+        elif chunk_id == b'data':
+            if not has_fmt:
+                raise ValueError("WAV file is missing its format chunk")
+            # Streaming writers leave the size as 0xFFFFFFFF: read to the end
+            audio_data = await audio_file.read(-1 if chunk_size == 0xFFFFFFFF else chunk_size)
+            if len(audio_data) < 1024:  # Basic check for empty/corrupted files
+                raise ValueError("Audio file appears to be empty or corrupted")
+            return audio_data
+        else:
+            # Skip metadata chunks (LIST, fact, ...) without reading them
+            await audio_file.seek(audio_file.file.tell() + padded_size)
 
 # New endpoint for generating video from audio file upload
 @app.post("/generate-from-audio")
@@ -181,20 +330,12 @@ async def generate_from_audio(
         if not audio_file.filename.lower().endswith('.wav'):
             raise ValueError("Only WAV audio files are currently supported")
             
-        # Read the audio file
-        audio_data = await audio_file.read()
-        
-        if len(audio_data) < 1024:  # Basic check for empty/corrupted files
-            raise ValueError("Audio file appears to be empty or corrupted")
+        # Validate the format from the header, then read just the PCM samples
+        audio_data = await read_wav_upload(audio_file)
             
         # Stream the animated frames
-        # We need to make sure we're returning an async generator, not a coroutine
-        async def stream_generator():
-            async for frame in generator.generate_frames_from_audio(audio_data):
-                yield frame
-                
         return StreamingResponse(
-            stream_generator(),
+            batched_stream(generator.generate_frames_from_audio(audio_data)),
             media_type='multipart/x-mixed-replace; boundary=frame'
         )
     except Exception as e:
@@ -247,15 +388,15 @@ async def get_debug_status():
     Get the current debug configuration.
     
     Returns:
-        dict: The current debug configuration settings
+        ORJSONResponse: The current debug configuration settings
     """
-    return {
+    return ORJSONResponse(content={
         "enabled": settings.debug.enabled,
         "save_frames": settings.debug.save_frames,
         "save_audio": settings.debug.save_audio,
         "frames_dir": settings.debug.frames_dir,
         "audio_dir": settings.debug.audio_dir
-    }
+    })
 
 @app.post("/debug/config")
 async def set_debug_config(config: DebugConfig):
@@ -266,7 +407,7 @@ async def set_debug_config(config: DebugConfig):
         config: The new debug configuration settings
         
     Returns:
-        dict: The updated debug configuration
+        ORJSONResponse: The updated debug configuration
     """
     settings.debug.enabled = config.enabled
     settings.debug.save_frames = config.save_frames
@@ -280,71 +421,82 @@ async def set_debug_config(config: DebugConfig):
         if config.save_audio and not os.path.exists(settings.debug.audio_dir):
             os.makedirs(settings.debug.audio_dir, exist_ok=True)
     
-    return {
+    return ORJSONResponse(content={
         "enabled": settings.debug.enabled,
         "save_frames": settings.debug.save_frames,
         "save_audio": settings.debug.save_audio,
         "frames_dir": settings.debug.frames_dir,
         "audio_dir": settings.debug.audio_dir
-    }
+    })
 
 @app.get("/get-tts-audio")
 async def get_tts_audio(
-    text: str
-) -> FileResponse:
+    text: str,
+    stream: bool = False
+) -> Response:
     """
     Generate TTS audio from text and return it as a downloadable WAV file.
     
     Args:
         text: The text to synthesize
+        stream: Stream the WAV sentence by sentence as it is synthesized. The total
+            length isn't known up front, so the header carries a placeholder size
+            and no X-Audio-Duration header is sent.
         
     Returns:
-        FileResponse: WAV audio file response
+        Response: WAV audio file response
     """
+    if stream:
+        header = streaming_wav_header(tts_service.sample_rate)
+        return StreamingResponse(
+            itertools.chain([header], tts_service.synthesize_stream(text)),
+            media_type="audio/wav",
+            headers={"Content-Disposition": "attachment; filename=tts_audio.wav"}
+        )
+    
     try:
-        # Get the raw audio data from the TTS service
-        raw_audio = tts_service.synthesize(text)
+        # Get the raw audio data from the TTS service (off the event loop, synthesis is blocking)
+        raw_audio = await asyncio.to_thread(tts_service.synthesize, text)
         if not raw_audio:
             raise HTTPException(status_code=500, detail="Failed to synthesize speech")
         
         # Calculate audio duration
         audio_duration = tts_service.get_audio_duration(raw_audio)
         
-        # Create a WAV file in memory
-        import io
-        import wave
+        # Reuse the serialized WAV if this text was requested before
+        cache_key = tts_service.cache_key(text) if isinstance(tts_service, CachedTTSService) else None
+        wav_data = wav_cache.get(cache_key) if cache_key else None
         
-        wav_bytes = io.BytesIO()
-        with wave.open(wav_bytes, "wb") as wav_file:
-            wav_file.setnchannels(1)  # Mono
-            wav_file.setsampwidth(2)  # 16-bit
-            wav_file.setframerate(tts_service.sample_rate)  # Sample rate (typically 16000)
-            wav_file.writeframes(raw_audio)
-        
-        # Reset the position to the beginning of the BytesIO object
-        wav_bytes.seek(0)
-        
-        # Create a temporary file for the FileResponse
-        import tempfile
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-        temp_file.write(wav_bytes.read())
-        temp_file_path = temp_file.name
-        temp_file.close()
+        if wav_data is None:
+            # Mono 16-bit PCM: the WAV file is just the 44-byte header followed by the samples
+            wav_data = wav_header(len(raw_audio), tts_service.sample_rate) + raw_audio
+            if cache_key:
+                wav_cache.put(cache_key, wav_data)
         
         # Return the audio file with appropriate headers, including the duration
-        return FileResponse(
-            path=temp_file_path,
+        return Response(
+            content=wav_data,
             media_type="audio/wav",
             headers={
                 "Content-Disposition": "attachment; filename=tts_audio.wav",
                 "X-Audio-Duration": str(audio_duration)  # Add duration as header
-            },
-            filename="tts_audio.wav",
-            background=fastapi.BackgroundTasks()
+            }
         )
     except Exception as e:
         logging.error(f"Error generating TTS audio: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error generating TTS audio: {str(e)}")
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Every worker loads its own copy of the models, so only scale out on CPU by default.
+    # Set WEB_CONCURRENCY to override (e.g. when the GPU has room for several copies).
+    default_workers = 1 if settings.models.device == "cuda" else min(4, os.cpu_count() or 1)
+    workers = int(os.getenv("WEB_CONCURRENCY", default_workers))
+    uvicorn.run(
+        "api:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=workers,
+        log_level="info"
+    )
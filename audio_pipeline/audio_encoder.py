@@ -5,15 +5,46 @@ This module provides a wrapper around the AudioEncoder neural network
 that extracts deep features from mel spectrograms.
 """
 
+import os
 import torch
 import torch.nn as nn
 import numpy as np
 from typing import Union, Optional
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+# Execution providers tried in order for the 'onnxrt' backend
+ONNX_PROVIDERS = [
+    'TensorrtExecutionProvider',
+    'CUDAExecutionProvider',
+    'CPUExecutionProvider',
+]
+
+# Batch size of the torch.compile warm-up passes (the default batch_size of
+# process_mel_windows / process_mel_spectrogram)
+COMPILE_WARMUP_BATCH = 64
+
+# Autocast dtype for each supported compute precision (None = no autocast)
+AMP_DTYPES = {
+    "fp32": None,
+    "fp16": torch.float16,
+    "bf16": torch.bfloat16,
+    "int8": None,
+}
+
+# Model input shapes for modes whose features must be zero-padded to fit
+PADDED_SHAPES = {
+    "hubert": (32, 32, 32),
+    "wenet": (256, 16, 32),
+}
+
 
 class Conv2d(nn.Module):
     """
@@ -46,6 +77,19 @@ class Conv2d(nn.Module):
             out += x
         return self.act(out)
 
+    def fuse(self):
+        """
+        Fold the BatchNorm into the convolution weights for inference.
+        
+        BatchNorm in eval mode is a fixed per-channel affine transform, so it can
+        be merged into the preceding conv's weight and bias, saving a full pass
+        over the activations. The block must be in eval mode, and the fused layer
+        can no longer load an unfused state_dict.
+        """
+        if isinstance(self.conv_block, nn.Sequential):
+            conv, bn = self.conv_block
+            self.conv_block = torch.nn.utils.fuse_conv_bn_eval(conv, bn)
+
 
 class AudioEncoder(nn.Module):
     """
@@ -88,7 +132,7 @@ class AudioEncoder(nn.Module):
             Conv2d(512, 512, kernel_size=1, stride=1, padding=0),
         )
         
-        logger.info("AudioEncoder initialized")
+        logger.debug("AudioEncoder initialized")
 
     def forward(self, x: torch.Tensor) -> torch.Tensor:
         """
@@ -105,6 +149,73 @@ class AudioEncoder(nn.Module):
         return out
 
 
+def export_onnx(model: nn.Module, output_path: str, opset_version: int = 17) -> str:
+    """
+    Export an AudioEncoder to ONNX with a dynamic batch axis.
+    
+    Args:
+        model: AudioEncoder in eval mode (fused or not)
+        output_path: Where to save the ONNX model
+        opset_version: ONNX opset version
+        
+    Returns:
+        output_path
+    """
+    device = next(model.parameters()).device
+    example_input = torch.randn(1, 1, 80, 16, device=device)
+    torch.onnx.export(
+        model,
+        example_input,
+        output_path,
+        export_params=True,
+        opset_version=opset_version,
+        do_constant_folding=True,
+        input_names=['mel_input'],
+        output_names=['features'],
+        dynamic_axes={
+            'mel_input': {0: 'batch_size'},
+            'features': {0: 'batch_size'}
+        }
+    )
+    logger.info(f"Exported AudioEncoder to ONNX: {output_path}")
+    return output_path
+
+
+def quantize_encoder_int8(
+    model: nn.Module,
+    calibration: torch.Tensor,
+    backend: str = "x86"
+) -> nn.Module:
+    """
+    Statically quantize an AudioEncoder's convolutions to INT8.
+    
+    Uses FX graph mode post-training quantization: observers are calibrated
+    on real model inputs, then the convs and residual add+ReLU pairs are
+    converted to quantized kernels. Dynamic quantization doesn't apply here
+    because it only covers Linear/RNN layers, not Conv2d.
+    
+    Args:
+        model: AudioEncoder in eval mode on CPU
+        calibration: Representative inputs with shape (n, 1, 80, 16)
+        backend: Quantized engine to target ('x86', 'fbgemm' or 'qnnpack' for ARM)
+        
+    Returns:
+        Quantized GraphModule
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+    
+    prepared = prepare_fx(
+        model,
+        get_default_qconfig_mapping(backend),
+        example_inputs=(calibration[:1],)
+    )
+    with torch.inference_mode():
+        for i in range(0, calibration.shape[0], 64):
+            prepared(calibration[i:i+64])
+    return convert_fx(prepared)
+
+
 class AudioEncoderWrapper:
     """
     Wrapper class for the AudioEncoder that handles:
@@ -118,7 +229,11 @@ class AudioEncoderWrapper:
         self,
         checkpoint_path: str,
         device: Optional[Union[str, torch.device]] = None,
-        mode: str = "ave"
+        mode: str = "ave",
+        precision: str = "fp32",
+        compile_model: bool = False,
+        backend: str = "torch",
+        onnx_path: Optional[str] = None
     ):
         """
         Initialize the AudioEncoder wrapper.
@@ -127,6 +242,20 @@ class AudioEncoderWrapper:
             checkpoint_path: Path to the pretrained model checkpoint
             device: Device to run inference on (cuda/cpu)
             mode: Audio feature mode ('ave', 'hubert', or 'wenet')
+            precision: Compute precision for the encoder: 'fp32' (default), 'fp16'
+                (autocast, CUDA only) or 'bf16' (autocast, CUDA or CPU). Reduced
+                precision is faster but drifts from the FP32 reference beyond 1e-4.
+                Ignored by the 'onnxrt' backend. See also quantize_int8() for
+                CPU inference.
+            compile_model: Compile the encoder with torch.compile in channels_last
+                layout. Pays a one-time compilation cost (done here, via a warm-up
+                forward) for fewer kernel launches on every later call.
+            backend: 'torch' (default) runs the PyTorch model; 'onnxrt' runs it
+                with ONNX Runtime, preferring the TensorRT and CUDA execution
+                providers when they are available.
+            onnx_path: ONNX model for the 'onnxrt' backend. Defaults to the
+                checkpoint path with an .onnx extension, and is exported from
+                the checkpoint if it doesn't exist yet.
         """
         if device is None:
             self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
@@ -135,27 +264,198 @@ class AudioEncoderWrapper:
         
         self.mode = mode
         
+        if precision not in ("fp32", "fp16", "bf16"):
+            raise ValueError(f"Unknown precision: {precision}")
+        if backend not in ("torch", "onnxrt"):
+            raise ValueError(f"Unknown backend: {backend}")
+        if backend == "onnxrt" and not ONNXRUNTIME_AVAILABLE:
+            raise ImportError("ONNX Runtime not available. Please install with 'pip install onnxruntime-gpu'.")
+        if backend == "onnxrt" and compile_model:
+            raise ValueError("compile_model only applies to the 'torch' backend")
+        if precision == "fp16" and self.device.type != 'cuda':
+            logger.warning("FP16 autocast requires CUDA, falling back to fp32")
+            precision = "fp32"
+        self.precision = precision
+        self._amp_device = 'cuda' if self.device.type == 'cuda' else 'cpu'
+        
         # Initialize model
         self.model = AudioEncoder().to(self.device)
         
         # Load checkpoint
         logger.info(f"Loading checkpoint from: {checkpoint_path}")
-        ckpt = torch.load(checkpoint_path, map_location=self.device)
+        self.model.load_state_dict(self._load_state_dict(checkpoint_path))
+        self.model.eval()
         
-        # Handle checkpoint format (may have 'audio_encoder.' prefix)
-        state_dict = {}
-        for k, v in ckpt.items():
-            if k.startswith('audio_encoder.'):
-                state_dict[k] = v
-            else:
-                state_dict[f'audio_encoder.{k}'] = v
+        # Fold BatchNorm into the convs now that the weights are final
+        self.model.apply(lambda m: m.fuse() if isinstance(m, Conv2d) else None)
         
-        self.model.load_state_dict(state_dict)
-        self.model.eval()
+        # (source features, context_size, padded copy) from the last window lookup
+        self._padded_cache = None
+        
+        # Zero-padding buffer for reshape_for_model, allocated once per mode
+        if mode in PADDED_SHAPES:
+            self._reshape_buf = np.zeros(int(np.prod(PADDED_SHAPES[mode])), dtype=np.float32)
+        else:
+            self._reshape_buf = None
+        self._reshape_filled = 0
+        
+        self.compiled = compile_model
+        if compile_model:
+            self._compile()
+        
+        self.backend = backend
+        self.session = None
+        if backend == "onnxrt":
+            self._init_onnx_session(onnx_path or os.path.splitext(checkpoint_path)[0] + ".onnx")
         
         logger.info(f"AudioEncoder loaded on device: {self.device}")
         logger.info(f"Mode: {mode}")
     
+    def _load_state_dict(self, checkpoint_path: str) -> dict:
+        """
+        Load the checkpoint with every key under the 'audio_encoder.' prefix.
+        
+        Checkpoints saved without the prefix are normalized once and written
+        next to the original as <checkpoint>.norm.pt, which later loads (e.g.
+        each server worker) read directly. A normalized copy older than the
+        checkpoint is ignored.
+        
+        Tensors stay on the CPU; load_state_dict copies them into the model on
+        its device.
+        """
+        norm_path = checkpoint_path + ".norm.pt"
+        # mmap avoids reading the whole file up front; weights_only refuses arbitrary pickles
+        if os.path.exists(norm_path) and os.path.getmtime(norm_path) >= os.path.getmtime(checkpoint_path):
+            return torch.load(norm_path, map_location='cpu', mmap=True, weights_only=True)
+        
+        ckpt = torch.load(checkpoint_path, map_location='cpu', mmap=True, weights_only=True)
+        if all(k.startswith('audio_encoder.') for k in ckpt):
+            return ckpt
+        
+        state_dict = {
+            (k if k.startswith('audio_encoder.') else f'audio_encoder.{k}'): v
+            for k, v in ckpt.items()
+        }
+        # Write under a per-process name and rename, so concurrent workers or an
+        # interrupted run never leave a truncated copy at norm_path
+        tmp_path = f"{norm_path}.{os.getpid()}.tmp"
+        try:
+            torch.save(state_dict, tmp_path)
+            os.replace(tmp_path, norm_path)
+        except OSError as e:
+            logger.warning(f"Could not cache normalized checkpoint at {norm_path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return state_dict
+    
+    def _compile(self):
+        """
+        Compile the encoder in channels_last layout and trigger compilation with warm-up passes.
+        
+        Falls back to the eager encoder if compilation fails (e.g. no Triton
+        or C++ compiler for the device).
+        """
+        eager = self.model
+        try:
+            self.model = torch.compile(
+                eager.to(memory_format=torch.channels_last), mode="reduce-overhead", fullgraph=True
+            )
+            # Two passes at the default batch size: the first compiles, the second
+            # records the CUDA graph that reduce-overhead replays from then on.
+            # The input is made like the batches of _encode (in inference mode,
+            # via contiguous() as in _to_device) so that it passes the same guards
+            with torch.inference_mode():
+                warmup = torch.zeros(COMPILE_WARMUP_BATCH, 1, 80, 16, device=self.device)
+                warmup = warmup.contiguous(memory_format=torch.channels_last)
+                self.model(warmup)
+                self.model(warmup)
+        except Exception as e:
+            logger.warning(f"torch.compile failed, using the eager encoder: {e}")
+            self.model = eager.to(memory_format=torch.contiguous_format)
+            self.compiled = False
+            return
+        logger.info("AudioEncoder compiled with torch.compile (channels_last)")
+    
+    def _init_onnx_session(self, onnx_path: str):
+        """Create the ONNX Runtime session, exporting the loaded model first if needed."""
+        if not os.path.exists(onnx_path):
+            export_onnx(self.model, onnx_path)
+        
+        if self.device.type == 'cuda':
+            available = ort.get_available_providers()
+            providers = [p for p in ONNX_PROVIDERS if p in available]
+        else:
+            providers = ['CPUExecutionProvider']
+        self.session = ort.InferenceSession(onnx_path, providers=providers)
+        self._onnx_input = self.session.get_inputs()[0].name
+        self._onnx_output = self.session.get_outputs()[0].name
+        logger.info(f"ONNX Runtime session created with providers: {self.session.get_providers()}")
+    
+    def _run_onnx(self, batch: torch.Tensor, out: torch.Tensor):
+        """
+        Run one batch through the ONNX Runtime session with IO binding.
+        
+        Input and output are bound to the torch tensors' memory, so the batch
+        is read and the features written in place on the wrapper's device,
+        without host round-trips. On CUDA, torch's stream is synchronized
+        first: the batch is produced there, and ORT reads it on its own stream.
+        """
+        batch = batch.contiguous()
+        if self.device.type == 'cuda':
+            torch.cuda.current_stream(self.device).synchronize()
+        device_id = self.device.index or 0
+        binding = self.session.io_binding()
+        binding.bind_input(
+            self._onnx_input, self.device.type, device_id, np.float32,
+            tuple(batch.shape), batch.data_ptr()
+        )
+        binding.bind_output(
+            self._onnx_output, self.device.type, device_id, np.float32,
+            tuple(out.shape), out.data_ptr()
+        )
+        self.session.run_with_iobinding(binding)
+    
+    def _to_model_input(self, mel_windows: np.ndarray) -> torch.Tensor:
+        """Convert (n_frames, 16, n_mels) windows to a (n_frames, 1, n_mels, 16) tensor on device."""
+        # Transpose/unsqueeze are views, so the only copy is the one to the device
+        mel_tensor = torch.from_numpy(np.asarray(mel_windows, dtype=np.float32))
+        return self._to_device(mel_tensor.transpose(1, 2).unsqueeze(1))
+    
+    def _to_device(self, mel_tensor: torch.Tensor) -> torch.Tensor:
+        """Move a (n, 1, n_mels, 16) CPU tensor to the device in the model's memory format."""
+        if self.device.type == 'cuda':
+            # Single pinned host-to-device copy instead of one per batch
+            mel_tensor = mel_tensor.pin_memory().to(self.device, non_blocking=True)
+        else:
+            mel_tensor = mel_tensor.to(self.device)
+        if self.compiled:
+            # contiguous() first: a strided view (e.g. the transposed windows)
+            # would otherwise get channels_last strides that differ from the
+            # warm-up input's in the size-1 channel dim and fail the stride guard
+            mel_tensor = mel_tensor.contiguous().contiguous(memory_format=torch.channels_last)
+        return mel_tensor
+    
+    def quantize_int8(self, calibration_windows: np.ndarray, backend: str = "x86"):
+        """
+        Statically quantize the encoder's convolutions to INT8 for CPU inference.
+        
+        See quantize_encoder_int8(); the observers are calibrated on real mel
+        windows.
+        
+        Args:
+            calibration_windows: Representative mel windows with shape (n, 16, n_mels),
+                e.g. the windows of one or two real clips
+            backend: Quantized engine to target ('x86', 'fbgemm' or 'qnnpack' for ARM)
+        """
+        if self.device.type != 'cpu' or self.compiled or self.session is not None:
+            raise RuntimeError("INT8 quantization requires an uncompiled encoder on CPU with the 'torch' backend")
+        
+        calibration = self._to_model_input(calibration_windows)
+        self.model = quantize_encoder_int8(self.model, calibration, backend)
+        self.precision = "int8"
+        
+        logger.info(f"AudioEncoder quantized to INT8 ({backend}) using {calibration.shape[0]} windows")
+    
     def process_mel_windows(
         self,
         mel_windows: np.ndarray,
@@ -172,29 +472,92 @@ class AudioEncoderWrapper:
             Audio features with shape (n_frames, 512)
         """
         n_frames = mel_windows.shape[0]
-        all_features = []
         
-        logger.info(f"Processing {n_frames} mel windows in batches of {batch_size}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Processing {n_frames} mel windows in batches of {batch_size}")
+        
+        # Made in inference mode like every other _encode input (and the compile
+        # warm-up), so a compiled encoder's dispatch-key guard still matches
+        with torch.inference_mode():
+            mel_tensor = self._to_model_input(mel_windows)
+        return self._encode(lambda i, j: mel_tensor[i:j], n_frames, batch_size)
+    
+    def process_mel_spectrogram(
+        self,
+        mel_spec: Union[np.ndarray, torch.Tensor],
+        window_starts: np.ndarray,
+        batch_size: int = 64
+    ) -> np.ndarray:
+        """
+        Process the 16-frame windows of a mel spectrogram through the audio encoder.
+        
+        Same result as process_mel_windows() on the stacked windows, but the
+        (n_frames, 16, n_mels) array is never built: consecutive windows overlap
+        by up to 15 mel frames, so each batch is gathered from a strided view of
+        mel_spec just before it is encoded, and only one batch exists at a time.
+        A torch mel_spec (e.g. from MelSpectrogramProcessor.process_audio_torch)
+        is gathered on the encoder's device, so a GPU spectrogram never goes
+        through host memory.
         
-        for i in range(0, n_frames, batch_size):
-            batch = mel_windows[i:i+batch_size]
+        Args:
+            mel_spec: Mel spectrogram with shape (n_mels, n_mel_frames)
+            window_starts: First mel frame of each window, e.g. from
+                MelSpectrogramProcessor.get_window_starts()
+            batch_size: Batch size for processing
             
-            # Convert to tensor: (batch, 16, n_mels) -> (batch, 1, n_mels, 16)
-            batch_tensor = torch.FloatTensor(batch)
-            batch_tensor = batch_tensor.transpose(1, 2)  # (batch, n_mels, 16)
-            batch_tensor = batch_tensor.unsqueeze(1)  # (batch, 1, n_mels, 16)
-            batch_tensor = batch_tensor.to(self.device)
+        Returns:
+            Audio features with shape (len(window_starts), 512)
+        """
+        n_frames = window_starts.shape[0]
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Processing {n_frames} mel windows in batches of {batch_size}")
+        
+        if isinstance(mel_spec, torch.Tensor):
+            # Same (n_mel_frames - 15, n_mels, 16) view, built with unfold on the device
+            device_windows = mel_spec.to(self.device, torch.float32).unfold(1, 16, 1).transpose(0, 1)
+            device_starts = torch.as_tensor(window_starts, device=self.device)
             
-            # Extract features
-            with torch.no_grad():
-                features = self.model(batch_tensor)
+            def get_device_batch(i: int, j: int) -> torch.Tensor:
+                batch = device_windows[device_starts[i:j]].unsqueeze(1)
+                if self.compiled:
+                    batch = batch.contiguous(memory_format=torch.channels_last)
+                return batch
             
-            all_features.append(features.cpu().numpy())
+            return self._encode(get_device_batch, n_frames, batch_size)
+        
+        # (n_mel_frames - 15, n_mels, 16) view of every window, in the model's layout
+        windows = np.lib.stride_tricks.sliding_window_view(
+            np.asarray(mel_spec, dtype=np.float32), 16, axis=1
+        ).transpose(1, 0, 2)
+        
+        def get_batch(i: int, j: int) -> torch.Tensor:
+            return self._to_device(torch.from_numpy(windows[window_starts[i:j]]).unsqueeze(1))
         
-        # Concatenate all batches
-        audio_features = np.concatenate(all_features, axis=0)
+        return self._encode(get_batch, n_frames, batch_size)
+    
+    def _encode(self, get_batch, n_frames: int, batch_size: int) -> np.ndarray:
+        """Run get_batch(i, j) model inputs through the encoder, batch by batch."""
+        # Batches are written straight into the output, read back with one copy at the end
+        audio_features = torch.empty((n_frames, 512), dtype=torch.float32, device=self.device)
+        
+        if self.session is not None:
+            for i in range(0, n_frames, batch_size):
+                self._run_onnx(get_batch(i, i + batch_size), audio_features[i:i+batch_size])
+            if self.device.type == 'cuda':
+                torch.cuda.synchronize(self.device)
+            return audio_features.cpu().numpy()
+        
+        amp_dtype = AMP_DTYPES[self.precision]
+        with torch.inference_mode(), \
+                torch.autocast(self._amp_device, dtype=amp_dtype, enabled=amp_dtype is not None):
+            for i in range(0, n_frames, batch_size):
+                audio_features[i:i+batch_size] = self.model(get_batch(i, i + batch_size))
+        
+        audio_features = audio_features.cpu().numpy()
         
-        logger.info(f"Extracted audio features with shape: {audio_features.shape}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Extracted audio features with shape: {audio_features.shape}")
         
         return audio_features
     
@@ -211,14 +574,32 @@ class AudioEncoderWrapper:
         Returns:
             Padded features with shape (n_frames + 2, 512)
         """
-        first_frame = features[:1]
-        last_frame = features[-1:]
-        padded = np.concatenate([first_frame, features, last_frame], axis=0)
+        # One allocation; np.empty skips zero-filling rows that are all overwritten
+        padded = np.empty((features.shape[0] + 2,) + features.shape[1:], dtype=features.dtype)
+        padded[0] = features[0]
+        padded[1:-1] = features
+        padded[-1] = features[-1]
         
-        logger.info(f"Added temporal padding: {features.shape} -> {padded.shape}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Added temporal padding: {features.shape} -> {padded.shape}")
         
         return padded
     
+    def _get_padded_features(self, all_features: np.ndarray, context_size: int) -> np.ndarray:
+        """
+        Zero-pad features with context_size frames on each side, cached per input array.
+        
+        Every frame of a clip is looked up against the same feature array, so the
+        padded copy is built once and reused for all of them.
+        """
+        cached = self._padded_cache
+        if cached is not None and cached[0] is all_features and cached[1] == context_size:
+            return cached[2]
+        
+        padded = np.pad(all_features, ((context_size, context_size), (0, 0)))
+        self._padded_cache = (all_features, context_size, padded)
+        return padded
+    
     def get_audio_features_for_frame(
         self,
         all_features: np.ndarray,
@@ -229,7 +610,8 @@ class AudioEncoderWrapper:
         Extract audio features for a specific frame with temporal context.
         
         This matches get_audio_features() from utils.py, which extracts
-        a window of ±8 frames around the target frame.
+        a window of ±8 frames around the target frame. Frames outside the
+        sequence are zeros.
         
         Args:
             all_features: All audio features with shape (n_frames, 512)
@@ -237,33 +619,35 @@ class AudioEncoderWrapper:
             context_size: Number of frames before and after (default: 8)
             
         Returns:
-            Feature window with shape (16, 512) for context_size=8
+            Feature window with shape (16, 512) for context_size=8. This is a
+            view into a cached padded copy of all_features; do not modify it.
         """
-        left = frame_idx - context_size
-        right = frame_idx + context_size
-        pad_left = 0
-        pad_right = 0
-        
-        # Handle boundaries
-        if left < 0:
-            pad_left = -left
-            left = 0
-        if right > all_features.shape[0]:
-            pad_right = right - all_features.shape[0]
-            right = all_features.shape[0]
-        
-        # Extract window
-        window = all_features[left:right]
-        
-        # Pad if necessary
-        if pad_left > 0:
-            padding = np.zeros((pad_left, window.shape[1]), dtype=window.dtype)
-            window = np.concatenate([padding, window], axis=0)
-        if pad_right > 0:
-            padding = np.zeros((pad_right, window.shape[1]), dtype=window.dtype)
-            window = np.concatenate([window, padding], axis=0)
-        
-        return window
+        padded = self._get_padded_features(all_features, context_size)
+        # padded[i] holds all_features[i - context_size], so the window
+        # [frame_idx - context_size, frame_idx + context_size) starts at frame_idx
+        return padded[frame_idx:frame_idx + 2 * context_size]
+    
+    def get_audio_feature_windows(
+        self,
+        all_features: np.ndarray,
+        context_size: int = 8
+    ) -> np.ndarray:
+        """
+        Get the temporal context windows for every frame at once.
+        
+        Args:
+            all_features: All audio features with shape (n_frames, 512)
+            context_size: Number of frames before and after (default: 8)
+            
+        Returns:
+            Strided view with shape (n_frames, 2 * context_size, 512) where
+            row i equals get_audio_features_for_frame(all_features, i). No
+            window data is copied.
+        """
+        padded = self._get_padded_features(all_features, context_size)
+        windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * context_size, axis=0)
+        # (n_frames + 1, 512, window) -> (n_frames, window, 512)
+        return windows[:all_features.shape[0]].transpose(0, 2, 1)
     
     def reshape_for_model(self, features: np.ndarray) -> np.ndarray:
         """
@@ -280,39 +664,69 @@ class AudioEncoderWrapper:
             - AVE: (32, 16, 16) = 8,192
             - Hubert: (32, 32, 32) = 32,768 (requires padding/interpolation)
             - WeNet: (256, 16, 32) = 131,072 (requires padding/interpolation)
+            For Hubert and WeNet the result is a view into a buffer that is reused
+            by the next call; copy it if it must outlive that call. For AVE it
+            is a view of features when features is contiguous.
         """
-        flat = features.flatten()
+        # No copy for contiguous windows such as get_audio_features_for_frame()'s
+        flat = features.reshape(-1)
         
         if self.mode == "ave":
             # 16 * 512 = 8192 = 32 * 16 * 16
             reshaped = flat.reshape(32, 16, 16)
-        elif self.mode == "hubert":
-            # Need to expand to 32 * 32 * 32 = 32,768
-            # Pad with zeros
-            target_size = 32 * 32 * 32
-            padded = np.zeros(target_size, dtype=flat.dtype)
-            padded[:flat.shape[0]] = flat
-            reshaped = padded.reshape(32, 32, 32)
-        elif self.mode == "wenet":
-            # Need to expand to 256 * 16 * 32 = 131,072
-            # Pad with zeros
-            target_size = 256 * 16 * 32
-            padded = np.zeros(target_size, dtype=flat.dtype)
-            padded[:flat.shape[0]] = flat
-            reshaped = padded.reshape(256, 16, 32)
+        elif self.mode in PADDED_SHAPES:
+            # Hubert needs 32 * 32 * 32 = 32,768, WeNet 256 * 16 * 32 = 131,072
+            # Pad with zeros, reusing the buffer allocated for this mode
+            padded = self._reshape_buf
+            n = flat.shape[0]
+            padded[:n] = flat
+            if n < self._reshape_filled:
+                # A previous, longer input left values past the end of this one
+                padded[n:self._reshape_filled] = 0
+            self._reshape_filled = n
+            reshaped = padded.reshape(PADDED_SHAPES[self.mode])
         else:
             raise ValueError(f"Unknown mode: {self.mode}")
         
         return reshaped
     
+    def reshape_windows_for_model(self, windows: np.ndarray) -> np.ndarray:
+        """
+        Batched reshape_for_model() for a stack of feature windows.
+        
+        Args:
+            windows: Feature windows with shape (n, 16, 512), e.g. a slice of
+                get_audio_feature_windows()
+            
+        Returns:
+            Array with shape (n, *model_shape) where row i equals
+            reshape_for_model(windows[i]). A new array for Hubert and WeNet
+            (zero-padded), a view of windows for AVE when possible.
+        """
+        n = windows.shape[0]
+        # A view for get_audio_feature_windows() output: each window is contiguous
+        flat = windows.reshape(n, -1)
+        
+        if self.mode == "ave":
+            return flat.reshape(n, 32, 16, 16)
+        elif self.mode in PADDED_SHAPES:
+            shape = PADDED_SHAPES[self.mode]
+            padded = np.zeros((n, int(np.prod(shape))), dtype=np.float32)
+            padded[:, :flat.shape[1]] = flat
+            return padded.reshape((n,) + shape)
+        else:
+            raise ValueError(f"Unknown mode: {self.mode}")
+    
     def save_features(self, features: np.ndarray, output_path: str):
         """Save audio features to a .npy file."""
         np.save(output_path, features)
-        logger.info(f"Saved audio features to: {output_path}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Saved audio features to: {output_path}")
     
-    def load_features(self, input_path: str) -> np.ndarray:
-        """Load audio features from a .npy file."""
-        features = np.load(input_path)
-        logger.info(f"Loaded audio features from: {input_path}")
+    def load_features(self, input_path: str, mmap: bool = False) -> np.ndarray:
+        """Load audio features from a .npy file (read-only memory-mapped if mmap is True)."""
+        features = np.load(input_path, mmap_mode='r' if mmap else None)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Loaded audio features from: {input_path}")
         return features
 
@@ -5,16 +5,61 @@ This module handles the conversion of audio waveforms to mel spectrograms.
 It replicates the exact behavior of the main SyncTalk_2D audio processing.
 """
 
+import hashlib
+import os
 import numpy as np
 import librosa
 import librosa.filters
-from scipy import signal
-from typing import Optional, Tuple
+import scipy.fft
+from numba import njit
+from typing import Iterable, Iterator, Optional, Tuple
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 20 * log10(x) == _DB_PER_LN * ln(x); ln is cheaper than log10
+_DB_PER_LN = 20.0 / np.log(10.0)
+
+
+@njit(cache=True)
+def _preemphasis(x: np.ndarray, coef: float, prev: float, out: np.ndarray):
+    """
+    First-order FIR y[n] = x[n] - coef * x[n-1], written into out.
+    
+    prev is x[-1], the filter state: the last sample of the previous block,
+    or 0.0 at the start of a signal (which leaves y[0] = x[0]).
+    """
+    if x.shape[0] == 0:
+        return
+    out[0] = x[0] - coef * prev
+    for i in range(1, x.shape[0]):
+        out[i] = x[i] - coef * x[i - 1]
+
+
+@njit(cache=True)
+def _magnitude(D: np.ndarray, out: np.ndarray):
+    """|D| as sqrt(re^2 + im^2), written into out (same shape as D)."""
+    for i in range(D.shape[0]):
+        for j in range(D.shape[1]):
+            z = D[i, j]
+            out[i, j] = np.sqrt(z.real * z.real + z.imag * z.imag)
+
+
+@njit(cache=True)
+def _db_normalize(S: np.ndarray, min_amp: float, ref_level_db: float,
+                  min_level_db: float, norm_scale: float, max_abs_value: float):
+    """
+    In-place fusion of _amp_to_db, the reference level and _normalize.
+    
+    Makes one read and one write per element instead of allocating a
+    temporary for every step. S must be C-contiguous.
+    """
+    flat = S.reshape(-1)
+    for i in range(flat.shape[0]):
+        db = _DB_PER_LN * np.log(max(min_amp, flat[i])) - ref_level_db
+        normalized = norm_scale * (db - min_level_db) - max_abs_value
+        flat[i] = min(max(normalized, -max_abs_value), max_abs_value)
+
 
 class MelSpectrogramProcessor:
     """
@@ -44,7 +89,9 @@ class MelSpectrogramProcessor:
         preemphasis_coef: float = 0.97,
         ref_level_db: float = 20.0,
         min_level_db: float = -100.0,
-        max_abs_value: float = 4.0
+        max_abs_value: float = 4.0,
+        cache_dir: Optional[str] = None,
+        fft_workers: int = -1
     ):
         """
         Initialize the mel spectrogram processor.
@@ -61,6 +108,11 @@ class MelSpectrogramProcessor:
             ref_level_db: Reference level in dB for normalization
             min_level_db: Minimum level in dB for clipping
             max_abs_value: Maximum absolute value for normalization
+            cache_dir: Directory for caching process_file() results, keyed by
+                the audio file's content and these parameters (e.g. ~/.cache/mel).
+                None disables the cache.
+            fft_workers: Threads for the STFT's FFTs (scipy.fft workers; -1 uses
+                all cores). Use 1 when processing several files in parallel.
         """
         self.sample_rate = sample_rate
         self.n_fft = n_fft
@@ -73,24 +125,40 @@ class MelSpectrogramProcessor:
         self.ref_level_db = ref_level_db
         self.min_level_db = min_level_db
         self.max_abs_value = max_abs_value
+        self.cache_dir = cache_dir
+        self.fft_workers = fft_workers
+        
+        # Constants of the dB conversion and normalization, computed once
+        self._min_amp = float(np.exp(-5 * np.log(10)))
+        self._norm_scale = (2 * max_abs_value) / (-min_level_db)
         
         # Build mel filterbank
         self._mel_basis = self._build_mel_basis()
         
-        logger.info(f"MelSpectrogramProcessor initialized with:")
-        logger.info(f"  Sample rate: {sample_rate} Hz")
-        logger.info(f"  n_fft: {n_fft}, hop: {hop_length}, win: {win_length}")
-        logger.info(f"  Mel bands: {n_mels}, freq range: {fmin}-{fmax} Hz")
+        # Analysis window, centered and zero-padded to n_fft as librosa.stft does
+        self._window = librosa.util.pad_center(
+            librosa.filters.get_window('hann', win_length, fftbins=True), size=n_fft
+        ).astype(np.float32)
+        
+        # Build and cache the n_fft-point FFT plan now rather than on the first file
+        scipy.fft.rfft(self._window[np.newaxis], axis=1, workers=fft_workers)
+        
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("MelSpectrogramProcessor initialized with:")
+            logger.info(f"  Sample rate: {sample_rate} Hz")
+            logger.info(f"  n_fft: {n_fft}, hop: {hop_length}, win: {win_length}")
+            logger.info(f"  Mel bands: {n_mels}, freq range: {fmin}-{fmax} Hz")
     
     def _build_mel_basis(self) -> np.ndarray:
-        """Build mel filter bank matrix."""
-        return librosa.filters.mel(
+        """Build mel filter bank matrix (float32, C-contiguous for BLAS)."""
+        return np.ascontiguousarray(librosa.filters.mel(
             sr=self.sample_rate,
             n_fft=self.n_fft,
             n_mels=self.n_mels,
             fmin=self.fmin,
-            fmax=self.fmax
-        )
+            fmax=self.fmax,
+            dtype=np.float32
+        ))
     
     def load_wav(self, path: str) -> np.ndarray:
         """
@@ -100,14 +168,14 @@ class MelSpectrogramProcessor:
             path: Path to the WAV file
             
         Returns:
-            Audio waveform as numpy array
+            Audio waveform as a float32 numpy array
         """
-        wav, sr = librosa.core.load(path, sr=self.sample_rate)
-        logger.info(f"Loaded audio: {path}")
-        logger.info(f"  Duration: {len(wav)/self.sample_rate:.2f}s, Shape: {wav.shape}")
+        wav, sr = librosa.core.load(path, sr=self.sample_rate, dtype=np.float32)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Loaded audio: {path} ({len(wav)/self.sample_rate:.2f}s, shape {wav.shape})")
         return wav
     
-    def preemphasis(self, wav: np.ndarray) -> np.ndarray:
+    def preemphasis(self, wav: np.ndarray, prev_sample: float = 0.0) -> np.ndarray:
         """
         Apply pre-emphasis filter to the audio waveform.
         
@@ -115,11 +183,15 @@ class MelSpectrogramProcessor:
         
         Args:
             wav: Audio waveform
+            prev_sample: Sample preceding wav, to continue filtering a signal
+                block by block (0.0 at the start of a signal)
             
         Returns:
-            Filtered audio waveform
+            Filtered audio waveform (float32 for float32 input)
         """
-        return signal.lfilter([1, -self.preemphasis_coef], [1], wav)
+        out = np.empty(wav.shape, dtype=np.result_type(wav.dtype, np.float32))
+        _preemphasis(wav, self.preemphasis_coef, prev_sample, out)
+        return out
     
     def _stft(self, y: np.ndarray) -> np.ndarray:
         """
@@ -129,14 +201,18 @@ class MelSpectrogramProcessor:
             y: Audio waveform
             
         Returns:
-            STFT result (complex-valued)
+            STFT result (complex-valued) with shape (n_fft // 2 + 1, n_frames)
         """
-        return librosa.stft(
-            y=y,
-            n_fft=self.n_fft,
-            hop_length=self.hop_length,
-            win_length=self.win_length
-        )
+        # Same framing as librosa.stft(center=True): zero-pad by half a window
+        return self._stft_frames(np.pad(y, self.n_fft // 2))
+    
+    def _stft_frames(self, y_padded: np.ndarray) -> np.ndarray:
+        """STFT of every complete n_fft window of an already padded signal."""
+        # Every hop_length-th window of a strided view (no copy)
+        frames = np.lib.stride_tricks.sliding_window_view(y_padded, self.n_fft)[::self.hop_length]
+        # scipy.fft keeps float32 input in single precision (complex64 output)
+        # and splits the frames across fft_workers threads
+        return scipy.fft.rfft(frames * self._window, axis=1, workers=self.fft_workers).T
     
     def _linear_to_mel(self, spectrogram: np.ndarray) -> np.ndarray:
         """
@@ -148,6 +224,9 @@ class MelSpectrogramProcessor:
         Returns:
             Mel spectrogram
         """
+        # One sgemm over all frames. The spectrogram from _stft is a transposed
+        # (Fortran-ordered) view, which BLAS consumes as-is via its transpose
+        # flag; making it C-contiguous first would only add a copy.
         return np.dot(self._mel_basis, spectrogram)
     
     def _amp_to_db(self, x: np.ndarray) -> np.ndarray:
@@ -160,8 +239,7 @@ class MelSpectrogramProcessor:
         Returns:
             Amplitude in decibels
         """
-        min_level = np.exp(-5 * np.log(10))
-        return 20 * np.log10(np.maximum(min_level, x))
+        return _DB_PER_LN * np.log(np.maximum(self._min_amp, x))
     
     def _normalize(self, S: np.ndarray) -> np.ndarray:
         """
@@ -177,7 +255,7 @@ class MelSpectrogramProcessor:
         """
         # Original formula: np.clip((2 * 4.) * ((S - -100) / (--100)) - 4., -4., 4.)
         # Simplified: np.clip(8.0 * ((S + 100) / 100) - 4.0, -4.0, 4.0)
-        normalized = (2 * self.max_abs_value) * ((S - self.min_level_db) / (-self.min_level_db)) - self.max_abs_value
+        normalized = self._norm_scale * (S - self.min_level_db) - self.max_abs_value
         return np.clip(normalized, -self.max_abs_value, self.max_abs_value)
     
     def process_audio(self, wav: np.ndarray) -> np.ndarray:
@@ -195,43 +273,178 @@ class MelSpectrogramProcessor:
             wav: Audio waveform
             
         Returns:
-            Mel spectrogram with shape (n_mels, n_frames)
+            Mel spectrogram (float32) with shape (n_mels, n_frames)
         """
-        # Apply pre-emphasis
-        wav_preemph = self.preemphasis(wav)
+        # Everything downstream (STFT, mel projection, encoder input) stays float32
+        wav = np.asarray(wav, dtype=np.float32)
+        
+        # Apply pre-emphasis, written straight into the zero-padded STFT input
+        # so the centered padding (see _stft) doesn't copy the signal again
+        pad = self.n_fft // 2
+        wav_padded = np.zeros(wav.shape[0] + 2 * pad, dtype=np.float32)
+        _preemphasis(wav, self.preemphasis_coef, 0.0, wav_padded[pad:pad + wav.shape[0]])
         
         # STFT
-        D = self._stft(wav_preemph)
+        D = self._stft_frames(wav_padded)
         
-        # Linear to mel
-        mel_spec = self._linear_to_mel(np.abs(D))
+        # Linear to mel, dB and normalization
+        mel_normalized = self._stft_to_mel(D)
         
-        # Amplitude to dB
-        mel_db = self._amp_to_db(mel_spec)
+        # min/max are full passes over the spectrogram, so only pay for them at DEBUG
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Mel spectrogram shape: {mel_normalized.shape}, "
+                         f"range: [{mel_normalized.min():.3f}, {mel_normalized.max():.3f}]")
         
-        # Apply reference level
-        mel_db = mel_db - self.ref_level_db
+        return mel_normalized
+    
+    def process_audio_torch(self, wav: "torch.Tensor") -> "torch.Tensor":
+        """
+        Convert an audio waveform tensor to a mel spectrogram on its device.
         
-        # Normalize
-        mel_normalized = self._normalize(mel_db)
+        Same steps and filterbank as process_audio(), in torch, so that on a
+        GPU the waveform is uploaded once and the spectrogram (and the
+        encoder windows gathered from it) never leave the device. Matches
+        process_audio() to float32 rounding.
         
-        logger.info(f"Mel spectrogram shape: {mel_normalized.shape}")
-        logger.info(f"  Value range: [{mel_normalized.min():.3f}, {mel_normalized.max():.3f}]")
+        Args:
+            wav: 1-D audio waveform tensor, on any device
+            
+        Returns:
+            Mel spectrogram (float32) with shape (n_mels, n_frames) on wav's device
+        """
+        import torch
+        import torch.nn.functional as F
         
-        return mel_normalized
+        wav = wav.to(torch.float32)
+        window = torch.from_numpy(self._window).to(wav.device)
+        mel_basis = torch.from_numpy(self._mel_basis).to(wav.device)
+        
+        # Pre-emphasis, then the same zero padding and framing as _stft
+        emphasized = torch.empty_like(wav)
+        emphasized[:1] = wav[:1]
+        emphasized[1:] = wav[1:] - self.preemphasis_coef * wav[:-1]
+        pad = self.n_fft // 2
+        frames = F.pad(emphasized, (pad, pad)).unfold(0, self.n_fft, self.hop_length)
+        
+        # (frames, bins) magnitude, mel projection, dB and normalization
+        magnitude = torch.fft.rfft(frames * window, dim=1).abs()
+        mel = mel_basis @ magnitude.T
+        db = _DB_PER_LN * torch.log(mel.clamp_min(self._min_amp)) - self.ref_level_db
+        normalized = self._norm_scale * (db - self.min_level_db) - self.max_abs_value
+        return normalized.clamp_(-self.max_abs_value, self.max_abs_value)
+    
+    def _stft_to_mel(self, D: np.ndarray) -> np.ndarray:
+        """Normalized mel spectrogram of an STFT (steps 3-5 of process_audio)."""
+        # Magnitude in the FFT's own (frames, bins) layout; cheaper than np.abs,
+        # which uses an overflow-safe hypot that float32 spectra don't need.
+        # The sqrt has to stay: the filterbank is applied to magnitudes, and
+        # mel_basis @ |D| is not sqrt(mel_basis @ |D|^2).
+        magnitude = np.empty(D.T.shape, dtype=D.real.dtype)
+        _magnitude(D.T, magnitude)
+        mel = self._linear_to_mel(magnitude.T)
+        
+        # Amplitude to dB, reference level and normalization, fused in place
+        # (same math as _amp_to_db and _normalize)
+        _db_normalize(
+            mel,
+            self._min_amp,
+            self.ref_level_db,
+            self.min_level_db,
+            self._norm_scale,
+            self.max_abs_value
+        )
+        return mel
+    
+    def stream(self, chunks: Iterable[np.ndarray]) -> Iterator[np.ndarray]:
+        """
+        Compute the mel spectrogram incrementally as audio chunks arrive.
+        
+        Frames are emitted as soon as their whole window has been received, so
+        mel extraction (and anything consuming it) can overlap with producing
+        or receiving the audio, and memory stays bounded by the chunk size.
+        Only the last n_fft - hop_length samples and the last input sample
+        (for pre-emphasis) are carried between chunks.
+        
+        Concatenating the yielded blocks along axis 1 gives process_audio() of
+        the concatenated chunks.
+        
+        Args:
+            chunks: Audio chunks (1-D arrays of any length)
+            
+        Yields:
+            Mel spectrogram blocks with shape (n_mels, n_new_frames)
+        """
+        # Leading half-window of zeros, as in _stft's centered padding
+        buffer = np.zeros(self.n_fft // 2, dtype=np.float32)
+        prev_sample = 0.0
+        
+        for chunk in chunks:
+            chunk = np.asarray(chunk, dtype=np.float32)
+            if chunk.shape[0] == 0:
+                continue
+            
+            # Filter state carries across the chunk boundary
+            chunk_preemph = self.preemphasis(chunk, prev_sample)
+            prev_sample = float(chunk[-1])
+            
+            buffer = np.concatenate([buffer, chunk_preemph])
+            n_new = (buffer.shape[0] - self.n_fft) // self.hop_length + 1
+            if n_new > 0:
+                yield self._stft_to_mel(self._stft_frames(buffer[:(n_new - 1) * self.hop_length + self.n_fft]))
+                # Keep from the start of the next frame on
+                buffer = buffer[n_new * self.hop_length:]
+        
+        # Trailing half-window of zeros flushes the remaining frames
+        buffer = np.concatenate([buffer, np.zeros(self.n_fft // 2, dtype=np.float32)])
+        if buffer.shape[0] >= self.n_fft:
+            yield self._stft_to_mel(self._stft_frames(buffer))
     
     def process_file(self, audio_path: str) -> np.ndarray:
         """
         Process an audio file directly.
         
+        With a cache_dir, the result is stored under a hash of the file content
+        and the processing parameters, so unchanged audio skips the STFT and
+        mel computation on later calls.
+        
         Args:
             audio_path: Path to audio file
             
         Returns:
             Mel spectrogram with shape (n_mels, n_frames)
         """
-        wav = self.load_wav(audio_path)
-        return self.process_audio(wav)
+        if self.cache_dir is None:
+            return self.process_audio(self.load_wav(audio_path))
+        
+        cache_path = os.path.join(self.cache_dir, f"{self._cache_key(audio_path)}.npy")
+        if os.path.exists(cache_path):
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Mel cache hit for {audio_path}: {cache_path}")
+            return np.load(cache_path)
+        
+        mel_spec = self.process_audio(self.load_wav(audio_path))
+        
+        # Write under a temporary name and rename, so readers never see a partial file
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, mel_spec)
+        os.replace(tmp_path, cache_path)
+        return mel_spec
+    
+    def _cache_key(self, audio_path: str) -> str:
+        """Hash of the audio file content and every parameter that affects the output."""
+        h = hashlib.blake2b(digest_size=16)
+        with open(audio_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        params = (
+            self.sample_rate, self.n_fft, self.hop_length, self.win_length,
+            self.n_mels, self.fmin, self.fmax, self.preemphasis_coef,
+            self.ref_level_db, self.min_level_db, self.max_abs_value,
+            str(self._mel_basis.dtype)
+        )
+        h.update(repr(params).encode())
+        return h.hexdigest()
     
     def get_frame_count(self, mel_spec: np.ndarray, fps: int = 25) -> int:
         """
@@ -267,24 +480,75 @@ class MelSpectrogramProcessor:
             fps: Video frame rate
             
         Returns:
-            Cropped mel spectrogram with shape (16, n_mels)
+            Cropped mel spectrogram with shape (16, n_mels), a view into mel_spec
         """
-        # Calculate mel frame index
-        start_idx = int(80.0 * (frame_idx / float(fps)))
-        end_idx = start_idx + 16
+        # The only inputs without a full window; checked up front instead of
+        # validating the cropped shape afterwards
+        if frame_idx < 0 or mel_spec.shape[1] < 16:
+            raise ValueError(
+                f"Cannot crop a 16-frame window for frame {frame_idx} "
+                f"from a mel spectrogram with {mel_spec.shape[1]} frames"
+            )
         
-        # Handle boundary conditions
-        if end_idx > mel_spec.shape[1]:
-            end_idx = mel_spec.shape[1]
-            start_idx = end_idx - 16
+        # Calculate mel frame index, clamped so the window ends at the last mel frame
+        start_idx = min(int(80.0 * (frame_idx / float(fps))), mel_spec.shape[1] - 16)
         
         # Transpose to match expected shape: (16, n_mels)
-        window = mel_spec[:, start_idx:end_idx].T
+        return mel_spec[:, start_idx:start_idx + 16].T
+    
+    def get_window_starts(
+        self,
+        mel_spec: np.ndarray,
+        n_frames: int,
+        fps: int = 25
+    ) -> np.ndarray:
+        """
+        Get the first mel frame of each video frame's 16-frame window.
         
-        if window.shape[0] != 16:
-            raise ValueError(f"Window shape is {window.shape}, expected (16, {self.n_mels})")
+        Args:
+            mel_spec: Mel spectrogram with shape (n_mels, n_frames)
+            n_frames: Number of video frames
+            fps: Video frame rate
+            
+        Returns:
+            Start indices with shape (n_frames,)
+        """
+        # Same start index and end-of-spectrogram clamp as crop_audio_window
+        starts = (80.0 * (np.arange(n_frames) / float(fps))).astype(np.int64)
+        return np.minimum(starts, mel_spec.shape[1] - 16)
+    
+    def crop_audio_windows(
+        self,
+        mel_spec: np.ndarray,
+        n_frames: int,
+        fps: int = 25,
+        out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Crop the 16-frame windows for the first n_frames video frames at once.
+        
+        Equivalent to stacking crop_audio_window() for every frame index, but
+        done as a single gather from a strided view of the spectrogram.
+        
+        Args:
+            mel_spec: Mel spectrogram with shape (n_mels, n_frames)
+            n_frames: Number of video frames
+            fps: Video frame rate
+            out: Optional preallocated (n_frames, 16, n_mels) array (e.g. an
+                np.lib.format.open_memmap file) to gather the windows into
+            
+        Returns:
+            Mel windows with shape (n_frames, 16, n_mels). Without out, the
+            data is stored as (n_frames, n_mels, 16), i.e. the encoder's input
+            layout.
+        """
+        starts = self.get_window_starts(mel_spec, n_frames, fps)
         
-        return window
+        # (n_mels, n_mel_frames - 15, 16) view of every 16-frame window
+        all_windows = np.lib.stride_tricks.sliding_window_view(mel_spec, 16, axis=1)
+        if out is not None:
+            return np.take(all_windows.transpose(1, 2, 0), starts, axis=0, out=out)
+        return all_windows.transpose(1, 0, 2)[starts].transpose(0, 2, 1)
     
     def save_mel_spectrogram(self, mel_spec: np.ndarray, output_path: str):
         """
@@ -295,19 +559,23 @@ class MelSpectrogramProcessor:
             output_path: Output file path
         """
         np.save(output_path, mel_spec)
-        logger.info(f"Saved mel spectrogram to: {output_path}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Saved mel spectrogram to: {output_path}")
     
-    def load_mel_spectrogram(self, input_path: str) -> np.ndarray:
+    def load_mel_spectrogram(self, input_path: str, mmap: bool = False) -> np.ndarray:
         """
         Load mel spectrogram from a .npy file.
         
         Args:
             input_path: Input file path
+            mmap: Memory-map the file read-only instead of reading it, so only
+                the pages that are accessed get loaded
             
         Returns:
-            Mel spectrogram
+            Mel spectrogram (a read-only np.memmap if mmap is True)
         """
-        mel_spec = np.load(input_path)
-        logger.info(f"Loaded mel spectrogram from: {input_path}")
+        mel_spec = np.load(input_path, mmap_mode='r' if mmap else None)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Loaded mel spectrogram from: {input_path}")
         return mel_spec
 
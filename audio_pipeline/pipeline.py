@@ -6,16 +6,60 @@ into a single pipeline that matches the behavior of inference_328.py.
 """
 
 import numpy as np
-from typing import Optional, Tuple
+import torch
+from typing import List, Optional, Sequence, Tuple
 import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 from .mel_processor import MelSpectrogramProcessor
 from .audio_encoder import AudioEncoderWrapper
 
-logging.basicConfig(level=logging.INFO)
+try:
+    from threadpoolctl import threadpool_limits
+    THREADPOOLCTL_AVAILABLE = True
+except ImportError:
+    THREADPOOLCTL_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# 'latency': one file at a time gets every core (multi-threaded FFTs);
+# 'throughput': many files in parallel, each single-threaded
+PARALLELISM_MODES = ("latency", "throughput")
+
+# Frames reshaped and written per block by process_and_save_all_frames
+SAVE_BLOCK_FRAMES = 256
+
+# Per-process pipeline used by AudioPipeline.process_files workers
+_worker_pipeline = None
+_worker_thread_limits = None
+
+
+def _init_worker(checkpoint_path: str, device: Optional[str], mode: str, fps: int,
+                 mel_cache_dir: Optional[str], compile_model: Optional[bool], n_threads: int):
+    """Build the pipeline (and load the encoder) once per worker process."""
+    global _worker_pipeline, _worker_thread_limits
+    # Split the cores between workers instead of every worker using all of them,
+    # in torch and in the BLAS/OpenMP pools numpy and scipy run on
+    torch.set_num_threads(n_threads)
+    if THREADPOOLCTL_AVAILABLE:
+        _worker_thread_limits = threadpool_limits(limits=n_threads)
+    _worker_pipeline = AudioPipeline(
+        checkpoint_path, device=device, mode=mode, fps=fps, mel_cache_dir=mel_cache_dir,
+        parallelism_mode="throughput", compile_model=compile_model
+    )
+
+
+def _process_in_worker(audio_path: str, output_dir: Optional[str]) -> Tuple[np.ndarray, dict]:
+    """Run one file through the worker's pipeline."""
+    return _worker_pipeline.process_audio_file(
+        audio_path,
+        save_intermediates=output_dir is not None,
+        output_dir=output_dir
+    )
+
 
 class AudioPipeline:
     """
@@ -31,7 +75,10 @@ class AudioPipeline:
         checkpoint_path: str,
         device: Optional[str] = None,
         mode: str = "ave",
-        fps: int = 25
+        fps: int = 25,
+        mel_cache_dir: Optional[str] = None,
+        parallelism_mode: str = "latency",
+        compile_model: Optional[bool] = None
     ):
         """
         Initialize the complete audio pipeline.
@@ -41,18 +88,46 @@ class AudioPipeline:
             device: Device to run inference on (cuda/cpu)
             mode: Audio feature mode ('ave', 'hubert', or 'wenet')
             fps: Target video frame rate
+            mel_cache_dir: Optional directory for caching mel spectrograms of
+                audio files (see MelSpectrogramProcessor)
+            parallelism_mode: 'latency' spreads each file's FFTs over all cores;
+                'throughput' keeps them single-threaded so that files can run
+                side by side without oversubscribing the CPU (process_files
+                workers always use it)
+            compile_model: Compile the encoder with torch.compile (see
+                AudioEncoderWrapper). None (default) compiles on CUDA only, where
+                CUDA graphs remove the per-batch launch overhead; the compile
+                cost is paid here, not on the first file.
         """
+        if parallelism_mode not in PARALLELISM_MODES:
+            raise ValueError(
+                f"Unknown parallelism_mode: {parallelism_mode} (expected one of {PARALLELISM_MODES})"
+            )
+        
+        self.checkpoint_path = checkpoint_path
+        self.device = device
         self.mode = mode
         self.fps = fps
+        self.mel_cache_dir = mel_cache_dir
+        self.parallelism_mode = parallelism_mode
+        if compile_model is None:
+            compile_model = (
+                torch.cuda.is_available() if device is None else torch.device(device).type == "cuda"
+            )
+        self.compile_model = compile_model
         
         # Initialize mel processor
-        self.mel_processor = MelSpectrogramProcessor()
+        self.mel_processor = MelSpectrogramProcessor(
+            cache_dir=mel_cache_dir,
+            fft_workers=1 if parallelism_mode == "throughput" else -1
+        )
         
         # Initialize audio encoder
         self.audio_encoder = AudioEncoderWrapper(
             checkpoint_path=checkpoint_path,
             device=device,
-            mode=mode
+            mode=mode,
+            compile_model=compile_model
         )
         
         logger.info("AudioPipeline initialized")
@@ -84,7 +159,8 @@ class AudioPipeline:
             - audio_features: Array with shape (n_frames, 512)
             - metadata: Dictionary with processing information
         """
-        logger.info(f"Processing audio file: {audio_path}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Processing audio file: {audio_path}")
         
         if save_intermediates and output_dir is None:
             raise ValueError("output_dir must be provided when save_intermediates=True")
@@ -94,41 +170,52 @@ class AudioPipeline:
             output_dir.mkdir(parents=True, exist_ok=True)
         
         # Step 1: Convert to mel spectrogram
-        logger.info("Step 1: Converting to mel spectrogram...")
-        mel_spec = self.mel_processor.process_file(audio_path)
+        logger.debug("Step 1: Converting to mel spectrogram...")
+        if self.audio_encoder.device.type == "cuda" and self.mel_cache_dir is None:
+            # Computed on the GPU, where the encoder also gathers its windows;
+            # the host copy is only for frame counts, metadata and saving
+            wav = torch.from_numpy(self.mel_processor.load_wav(audio_path))
+            mel_input = self.mel_processor.process_audio_torch(wav.to(self.audio_encoder.device))
+            mel_spec = mel_input.cpu().numpy()
+        else:
+            mel_spec = self.mel_processor.process_file(audio_path)
+            mel_input = mel_spec
         
         if save_intermediates:
             mel_path = output_dir / "mel_spectrogram.npy"
             self.mel_processor.save_mel_spectrogram(mel_spec, str(mel_path))
         
         # Step 2: Get frame count and extract windows
-        logger.info("Step 2: Extracting mel windows for each frame...")
+        logger.debug("Step 2: Extracting mel windows for each frame...")
         n_frames = self.mel_processor.get_frame_count(mel_spec, self.fps)
-        logger.info(f"  Total frames: {n_frames}")
-        
-        mel_windows = []
-        for i in range(n_frames):
-            window = self.mel_processor.crop_audio_window(mel_spec, i, self.fps)
-            mel_windows.append(window)
-        mel_windows = np.array(mel_windows)
         
-        logger.info(f"  Mel windows shape: {mel_windows.shape}")
+        # The windows overlap heavily, so they are only described by their start
+        # frames here; the encoder gathers them from mel_spec batch by batch
+        window_starts = self.mel_processor.get_window_starts(mel_spec, n_frames, self.fps)
+        mel_windows_shape = (n_frames, 16, mel_spec.shape[0])
         
         if save_intermediates:
             windows_path = output_dir / "mel_windows.npy"
-            np.save(windows_path, mel_windows)
-            logger.info(f"  Saved mel windows to: {windows_path}")
+            # Gathered straight into the preallocated .npy file, one row per frame
+            mel_windows = np.lib.format.open_memmap(
+                windows_path, mode='w+', dtype=mel_spec.dtype, shape=mel_windows_shape
+            )
+            self.mel_processor.crop_audio_windows(mel_spec, n_frames, self.fps, out=mel_windows)
+            mel_windows.flush()
+            del mel_windows
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"  Saved mel windows to: {windows_path}")
         
         # Step 3: Process through AudioEncoder
-        logger.info("Step 3: Extracting deep features with AudioEncoder...")
-        audio_features = self.audio_encoder.process_mel_windows(mel_windows)
+        logger.debug("Step 3: Extracting deep features with AudioEncoder...")
+        audio_features = self.audio_encoder.process_mel_spectrogram(mel_input, window_starts)
         
         if save_intermediates:
             features_path = output_dir / "audio_features_raw.npy"
             self.audio_encoder.save_features(audio_features, str(features_path))
         
         # Step 4: Add temporal padding
-        logger.info("Step 4: Adding temporal padding...")
+        logger.debug("Step 4: Adding temporal padding...")
         audio_features_padded = self.audio_encoder.add_temporal_padding(audio_features)
         
         if save_intermediates:
@@ -142,18 +229,68 @@ class AudioPipeline:
             'fps': self.fps,
             'n_frames': n_frames,
             'mel_shape': mel_spec.shape,
-            'mel_windows_shape': mel_windows.shape,
+            'mel_windows_shape': mel_windows_shape,
             'features_shape': audio_features.shape,
             'features_padded_shape': audio_features_padded.shape,
             'mel_value_range': (float(mel_spec.min()), float(mel_spec.max())),
             'features_value_range': (float(audio_features_padded.min()), float(audio_features_padded.max())),
         }
         
-        logger.info("Pipeline processing complete!")
-        logger.info(f"  Output shape: {audio_features_padded.shape}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"Processed {audio_path}: {n_frames} frames, features {audio_features_padded.shape}")
         
         return audio_features_padded, metadata
     
+    def process_files(
+        self,
+        audio_paths: Sequence[str],
+        output_dirs: Optional[Sequence[str]] = None,
+        workers: Optional[int] = None
+    ) -> List[Tuple[np.ndarray, dict]]:
+        """
+        Process several audio files in parallel, one file per worker process.
+        
+        Files are independent, so they are spread over a process pool (the
+        mel and FFT work holds the GIL for long stretches). Each worker loads
+        its own copy of the encoder once and reuses it for all its files, and
+        runs in 'throughput' mode with its torch, BLAS and FFT threads limited
+        to its share of the cores.
+        
+        Args:
+            audio_paths: Paths to audio files
+            output_dirs: Optional per-file directories for intermediate outputs
+                (same length as audio_paths)
+            workers: Number of worker processes (default: CPU count, capped
+                at the number of files)
+            
+        Returns:
+            List of (audio_features, metadata) tuples in the order of audio_paths
+        """
+        if output_dirs is None:
+            output_dirs = [None] * len(audio_paths)
+        if len(output_dirs) != len(audio_paths):
+            raise ValueError("output_dirs must have one entry per audio path")
+        
+        workers = min(workers or os.cpu_count() or 1, len(audio_paths))
+        if workers <= 1:
+            return [
+                self.process_audio_file(path, save_intermediates=out is not None, output_dir=out)
+                for path, out in zip(audio_paths, output_dirs)
+            ]
+        
+        n_threads = max(1, (os.cpu_count() or 1) // workers)
+        logger.info(f"Processing {len(audio_paths)} files with {workers} workers")
+        
+        # spawn rather than fork: forked children can't use CUDA or torch's thread pools safely
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.checkpoint_path, self.device, self.mode, self.fps, self.mel_cache_dir,
+                      self.compile_model, n_threads)
+        ) as executor:
+            return list(executor.map(_process_in_worker, audio_paths, output_dirs))
+    
     def get_frame_features(
         self,
         audio_features: np.ndarray,
@@ -190,6 +327,37 @@ class AudioPipeline:
         
         return features
     
+    def get_all_frame_features(
+        self,
+        audio_features: np.ndarray,
+        n_frames: Optional[int] = None,
+        reshape: bool = True
+    ) -> np.ndarray:
+        """
+        Get model-ready features for every frame at once.
+        
+        Row i equals get_frame_features(audio_features, i, reshape), but the
+        windows come from one strided view and are reshaped in one call.
+        
+        Args:
+            audio_features: Padded audio features with shape (n_frames, 512)
+            n_frames: Number of leading frames to return (default: one per
+                row of audio_features)
+            reshape: Whether to reshape for model input
+            
+        Returns:
+            Feature tensor with shape (n_frames, 16, 512) if reshape=False,
+            otherwise (n_frames, *mode-specific shape). Without reshape (and
+            for AVE) this is a view into a cached padded copy of
+            audio_features; do not modify it.
+        """
+        windows = self.audio_encoder.get_audio_feature_windows(audio_features)[:n_frames]
+        
+        if reshape:
+            return self.audio_encoder.reshape_windows_for_model(windows)
+        
+        return windows
+    
     def process_and_save_all_frames(
         self,
         audio_path: str,
@@ -198,7 +366,9 @@ class AudioPipeline:
         """
         Process an audio file and save features for all frames.
         
-        This creates a complete reference dataset for iOS validation.
+        This creates a complete reference dataset for iOS validation. Frame
+        features are saved as frames_window.npy (n_frames, 16, 512) and
+        frames_reshaped.npy (n_frames, *reshaped_shape); frame i is row i.
         
         Args:
             audio_path: Path to audio file
@@ -221,29 +391,40 @@ class AudioPipeline:
             json.dump(metadata, f, indent=2)
         logger.info(f"Saved metadata to: {metadata_path}")
         
-        # Save per-frame features
-        frames_dir = output_dir / "frames"
-        frames_dir.mkdir(exist_ok=True)
-        
+        # Save per-frame features, stacked into one array per artifact instead
+        # of two tiny .npy files per frame. The arrays are written through a
+        # memory map, so the whole dataset never has to be resident at once.
         n_frames = metadata['n_frames']
         logger.info(f"Saving features for {n_frames} frames...")
         
-        for frame_idx in range(n_frames):
-            # Get unreshaped features (temporal window)
-            features_window = self.get_frame_features(
-                audio_features, frame_idx, reshape=False
-            )
+        windows_path = output_dir / "frames_window.npy"
+        reshaped_path = output_dir / "frames_reshaped.npy"
+        frames_window = np.lib.format.open_memmap(
+            windows_path, mode='w+', dtype=np.float32, shape=(n_frames, 16, 512)
+        )
+        frames_reshaped = np.lib.format.open_memmap(
+            reshaped_path, mode='w+', dtype=np.float32,
+            shape=(n_frames,) + self._get_reshaped_shape()
+        )
+        
+        # Row i of the windows view is get_frame_features(audio_features, i, reshape=False);
+        # blocks are reshaped and written together, bounding memory for the padded modes
+        windows = self.audio_encoder.get_audio_feature_windows(audio_features)
+        for start in range(0, n_frames, SAVE_BLOCK_FRAMES):
+            stop = min(start + SAVE_BLOCK_FRAMES, n_frames)
+            block = windows[start:stop]
             
-            # Get reshaped features (model input)
-            features_reshaped = self.get_frame_features(
-                audio_features, frame_idx, reshape=True
-            )
+            # Unreshaped features (temporal window)
+            frames_window[start:stop] = block
             
-            # Save both
-            np.save(frames_dir / f"frame_{frame_idx:05d}_window.npy", features_window)
-            np.save(frames_dir / f"frame_{frame_idx:05d}_reshaped.npy", features_reshaped)
+            # Reshaped features (model input)
+            frames_reshaped[start:stop] = self.audio_encoder.reshape_windows_for_model(block)
+        
+        frames_window.flush()
+        frames_reshaped.flush()
+        del frames_window, frames_reshaped
         
-        logger.info(f"Saved all frame features to: {frames_dir}")
+        logger.info(f"Saved all frame features to: {windows_path}, {reshaped_path}")
         
         # Create a summary file
         summary = {
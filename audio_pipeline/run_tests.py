@@ -10,6 +10,7 @@ Usage:
 
 import sys
 import argparse
+import logging
 from pathlib import Path
 
 # Add parent to path
@@ -24,13 +25,18 @@ def run_unit_tests():
     
     try:
         import pytest
+        args = ['tests/', '-v', '--tb=short', '--color=yes']
+        
+        # Spread the test files over all cores when pytest-xdist is installed;
+        # loadfile keeps each file (and its fixtures and output dirs) in one worker
+        try:
+            import xdist  # noqa: F401
+            args += ['-n', 'auto', '--dist', 'loadfile']
+        except ImportError:
+            pass
+        
         # Run pytest programmatically
-        exit_code = pytest.main([
-            'tests/',
-            '-v',
-            '--tb=short',
-            '--color=yes'
-        ])
+        exit_code = pytest.main(args)
         return exit_code == 0
     except ImportError:
         print("pytest not installed, running tests manually...")
@@ -123,6 +129,9 @@ def main():
     
     args = parser.parse_args()
     
+    # The pipeline modules no longer configure logging on import
+    logging.basicConfig(level=logging.INFO)
+    
     results = {}
     
     # Run unit tests
@@ -0,0 +1,23 @@
+"""
+Shared fixtures for the audio pipeline tests.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+import torch
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from audio_pipeline.audio_encoder import AudioEncoder
+
+
+@pytest.fixture
+def tmp_checkpoint(tmp_path):
+    """Save a randomly initialized AudioEncoder checkpoint."""
+    torch.manual_seed(0)
+    ckpt_path = tmp_path / "audio_encoder.pth"
+    torch.save(AudioEncoder().state_dict(), ckpt_path)
+    return str(ckpt_path)
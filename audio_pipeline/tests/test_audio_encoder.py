@@ -4,6 +4,7 @@ Unit tests for AudioEncoder
 These tests validate the audio encoder model behavior.
 """
 
+import copy
 import numpy as np
 import torch
 import pytest
@@ -13,7 +14,32 @@ from pathlib import Path
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from audio_pipeline.audio_encoder import AudioEncoder, AudioEncoderWrapper
+from audio_pipeline.audio_encoder import (
+    AudioEncoder, AudioEncoderWrapper, Conv2d, quantize_encoder_int8
+)
+
+# Deterministic inputs generated once and shared by the tests (never modified;
+# left writable because torch.from_numpy warns on read-only arrays)
+_RNG = np.random.default_rng(0)
+_MEL_WINDOWS = _RNG.standard_normal((32, 16, 80), dtype=np.float32)
+_MEL_SPEC = _RNG.standard_normal((80, 100), dtype=np.float32)
+_FEATURES = _RNG.standard_normal((32, 512), dtype=np.float32)
+
+
+def script_encoder(model: AudioEncoder) -> torch.jit.ScriptModule:
+    """
+    Compile an AudioEncoder to a frozen TorchScript module.
+    
+    Freezing inlines the weights as constants so Conv-BN-ReLU chains get
+    fused; two warm-up calls let the profiling executor specialize the
+    graph before the first asserted forward pass.
+    """
+    scripted = torch.jit.freeze(torch.jit.script(model.eval()))
+    x = torch.randn(1, 1, 80, 16)
+    with torch.jit.optimized_execution(True), torch.no_grad():
+        scripted(x)
+        scripted(x)
+    return scripted
 
 
 class TestAudioEncoder:
@@ -24,47 +50,83 @@ class TestAudioEncoder:
         """Create an AudioEncoder instance."""
         return AudioEncoder()
     
+    @pytest.fixture(scope="class")
+    def reference_model(self):
+        """FP32 eager AudioEncoder the scripted variants are built from."""
+        torch.manual_seed(0)
+        return AudioEncoder().eval()
+    
+    @pytest.fixture(scope="class", params=["fp32", "int8"])
+    def scripted_model(self, request, reference_model):
+        """Frozen TorchScript AudioEncoder, in FP32 and INT8, shared by the forward-pass tests."""
+        model = copy.deepcopy(reference_model)
+        if request.param == "int8":
+            # The default engine is already the platform's (x86, or qnnpack on ARM)
+            calibration = torch.randn(32, 1, 80, 16)
+            model = quantize_encoder_int8(model, calibration, torch.backends.quantized.engine)
+        return script_encoder(model)
+    
     def test_initialization(self, model):
         """Test that model initializes."""
         assert model is not None
         assert isinstance(model, torch.nn.Module)
     
-    def test_forward_shape(self, model):
+    def test_forward_shape(self, scripted_model):
         """Test that forward pass returns correct shape."""
         # Input: [batch, 1, 80, 16]
         batch_size = 4
         x = torch.randn(batch_size, 1, 80, 16)
         
         # Forward pass
-        model.eval()
-        with torch.no_grad():
-            output = model(x)
+        with torch.jit.optimized_execution(True), torch.no_grad():
+            output = scripted_model(x)
         
         # Output should be [batch, 512]
         assert output.shape == (batch_size, 512)
     
-    def test_single_sample(self, model):
+    def test_single_sample(self, scripted_model):
         """Test with single sample."""
         x = torch.randn(1, 1, 80, 16)
         
-        model.eval()
-        with torch.no_grad():
-            output = model(x)
+        with torch.jit.optimized_execution(True), torch.no_grad():
+            output = scripted_model(x)
         
         assert output.shape == (1, 512)
     
-    def test_output_range(self, model):
-        """Test that output values are reasonable."""
+    def test_output_range(self, scripted_model, reference_model):
+        """Test that output values are reasonable and match the FP32 encoder."""
         x = torch.randn(2, 1, 80, 16)
         
-        model.eval()
-        with torch.no_grad():
-            output = model(x)
+        with torch.jit.optimized_execution(True), torch.no_grad():
+            output = scripted_model(x)
+            expected = reference_model(x)
         
         # Output should not be all zeros or infinities
         assert not torch.isnan(output).any()
         assert not torch.isinf(output).any()
         assert output.abs().max() > 0
+        
+        # INT8 is not bitwise equal to FP32, so compare directions
+        similarity = torch.nn.functional.cosine_similarity(output, expected, dim=1)
+        assert similarity.min() >= 0.99
+    
+    def test_fuse_conv_bn(self, model):
+        """Test that folding BatchNorm into the convs preserves the output."""
+        # Give BatchNorm non-trivial statistics so the fold actually does something
+        for m in model.modules():
+            if isinstance(m, torch.nn.BatchNorm2d):
+                m.running_mean.uniform_(-0.5, 0.5)
+                m.running_var.uniform_(0.5, 2.0)
+        x = torch.randn(2, 1, 80, 16)
+        
+        model.eval()
+        with torch.no_grad():
+            expected = model(x)
+            model.apply(lambda m: m.fuse() if isinstance(m, Conv2d) else None)
+            output = model(x)
+        
+        assert not any(isinstance(m, torch.nn.BatchNorm2d) for m in model.modules())
+        assert torch.allclose(output, expected, atol=1e-4)
 
 
 class TestAudioEncoderWrapper:
@@ -75,17 +137,53 @@ class TestAudioEncoderWrapper:
         """Get the checkpoint path."""
         return "model/checkpoints/audio_visual_encoder.pth"
     
+    @pytest.fixture
+    def wrapper(self, tmp_checkpoint):
+        """Create a wrapper around a randomly initialized checkpoint."""
+        return AudioEncoderWrapper(tmp_checkpoint, device="cpu")
+    
+    def test_process_mel_windows(self, wrapper):
+        """Test that batched processing matches running each window on its own."""
+        mel_windows = _MEL_WINDOWS[:10]
+        
+        features = wrapper.process_mel_windows(mel_windows, batch_size=4)
+        assert features.shape == (10, 512)
+        assert features.dtype == np.float32
+        
+        with torch.no_grad():
+            expected = wrapper.model(
+                torch.from_numpy(mel_windows[3:4]).transpose(1, 2).unsqueeze(1)
+            ).numpy()
+        assert np.allclose(features[3:4], expected, atol=1e-5)
+    
+    def test_process_mel_spectrogram(self, wrapper):
+        """Test that encoding from the spectrogram matches encoding stacked windows."""
+        from audio_pipeline.mel_processor import MelSpectrogramProcessor
+        processor = MelSpectrogramProcessor()
+        mel_spec = _MEL_SPEC
+        n_frames = processor.get_frame_count(mel_spec)
+        
+        starts = processor.get_window_starts(mel_spec, n_frames)
+        features = wrapper.process_mel_spectrogram(mel_spec, starts, batch_size=8)
+        expected = wrapper.process_mel_windows(processor.crop_audio_windows(mel_spec, n_frames))
+        
+        assert features.shape == (n_frames, 512)
+        assert np.allclose(features, expected, atol=1e-6)
+        
+        # A torch spectrogram is gathered on the device with the same windows
+        device_features = wrapper.process_mel_spectrogram(
+            torch.from_numpy(mel_spec).to(wrapper.device), starts, batch_size=8
+        )
+        assert np.allclose(device_features, features, atol=1e-6)
+    
     def test_temporal_padding(self):
         """Test temporal padding."""
         # Create dummy features
-        features = np.random.randn(10, 512).astype(np.float32)
+        features = _FEATURES[:10]
         
         # Dummy wrapper (we'll just test the method)
         class DummyWrapper:
-            def add_temporal_padding(self, features):
-                first_frame = features[:1]
-                last_frame = features[-1:]
-                return np.concatenate([first_frame, features, last_frame], axis=0)
+            add_temporal_padding = AudioEncoderWrapper.add_temporal_padding
         
         wrapper = DummyWrapper()
         padded = wrapper.add_temporal_padding(features)
@@ -94,40 +192,93 @@ class TestAudioEncoderWrapper:
         assert padded.shape == (12, 512)
         
         # First frame should be repeated
-        assert np.allclose(padded[0], features[0])
+        assert np.array_equal(padded[0], features[0])
         
         # Last frame should be repeated
-        assert np.allclose(padded[-1], features[-1])
+        assert np.array_equal(padded[-1], features[-1])
+        
+        # Frames in between are unchanged
+        assert np.array_equal(padded[1:-1], features)
+        assert padded.dtype == features.dtype
     
+    def test_quantize_int8(self, wrapper):
+        """Test that INT8 quantization stays close to the FP32 features."""
+        mel_windows = _MEL_WINDOWS
+        expected = wrapper.process_mel_windows(mel_windows)
+        
+        wrapper.quantize_int8(mel_windows)
+        features = wrapper.process_mel_windows(mel_windows)
+        
+        assert wrapper.precision == "int8"
+        assert features.shape == expected.shape
+        rel_error = np.linalg.norm(features - expected) / np.linalg.norm(expected)
+        assert rel_error < 0.05
+
+    def test_normalized_checkpoint_cache(self, tmp_path, tmp_checkpoint, wrapper):
+        """Test that unprefixed checkpoints are normalized once and cached."""
+        state_dict = {
+            k[len('audio_encoder.'):]: v
+            for k, v in torch.load(tmp_checkpoint).items()
+        }
+        bare_path = str(tmp_path / "bare.pth")
+        torch.save(state_dict, bare_path)
+
+        first = AudioEncoderWrapper(bare_path, device="cpu")
+        assert Path(bare_path + ".norm.pt").exists()
+        assert not list(tmp_path.glob("*.tmp"))
+        second = AudioEncoderWrapper(bare_path, device="cpu")
+
+        mel_windows = _MEL_WINDOWS[:4]
+        expected = wrapper.process_mel_windows(mel_windows)
+        assert np.allclose(first.process_mel_windows(mel_windows), expected, atol=1e-6)
+        assert np.allclose(second.process_mel_windows(mel_windows), expected, atol=1e-6)
+
+    def test_onnxrt_backend(self, tmp_checkpoint, wrapper):
+        """Test that the ONNX Runtime backend matches the PyTorch features."""
+        pytest.importorskip("onnxruntime")
+        pytest.importorskip("onnx")
+        mel_windows = _MEL_WINDOWS[:10]
+        expected = wrapper.process_mel_windows(mel_windows)
+
+        onnx_wrapper = AudioEncoderWrapper(tmp_checkpoint, device="cpu", backend="onnxrt")
+        features = onnx_wrapper.process_mel_windows(mel_windows, batch_size=4)
+
+        assert features.shape == expected.shape
+        assert np.allclose(features, expected, atol=1e-4)
+
+    @pytest.mark.skipif(not torch.cuda.is_available(), reason="CUDA not available")
+    def test_onnxrt_backend_cuda_torch_mel(self, tmp_checkpoint):
+        """Test that ONNX Runtime on CUDA reads batches gathered on torch's stream."""
+        ort = pytest.importorskip("onnxruntime")
+        pytest.importorskip("onnx")
+        if 'CUDAExecutionProvider' not in ort.get_available_providers():
+            pytest.skip("CUDAExecutionProvider not available")
+        from audio_pipeline.mel_processor import MelSpectrogramProcessor
+        processor = MelSpectrogramProcessor()
+        n_frames = processor.get_frame_count(_MEL_SPEC)
+        starts = processor.get_window_starts(_MEL_SPEC, n_frames)
+        mel_spec = torch.from_numpy(_MEL_SPEC).cuda()
+
+        torch_wrapper = AudioEncoderWrapper(tmp_checkpoint, device="cuda")
+        onnx_wrapper = AudioEncoderWrapper(tmp_checkpoint, device="cuda", backend="onnxrt")
+        expected = torch_wrapper.process_mel_spectrogram(mel_spec, starts, batch_size=8)
+        features = onnx_wrapper.process_mel_spectrogram(mel_spec, starts, batch_size=8)
+
+        assert features.shape == expected.shape
+        assert np.allclose(features, expected, atol=1e-4)
+
     def test_get_audio_features_for_frame(self):
         """Test extracting features for a specific frame."""
         # Create dummy features
         n_frames = 20
-        features = np.random.randn(n_frames, 512).astype(np.float32)
+        features = _FEATURES[:n_frames]
         
         # Test extraction
         def get_audio_features_for_frame(all_features, frame_idx, context_size=8):
-            left = frame_idx - context_size
-            right = frame_idx + context_size
-            pad_left = 0
-            pad_right = 0
-            
-            if left < 0:
-                pad_left = -left
-                left = 0
-            if right > all_features.shape[0]:
-                pad_right = right - all_features.shape[0]
-                right = all_features.shape[0]
-            
-            window = all_features[left:right]
-            
-            if pad_left > 0:
-                padding = np.zeros((pad_left, window.shape[1]), dtype=window.dtype)
-                window = np.concatenate([padding, window], axis=0)
-            if pad_right > 0:
-                padding = np.zeros((pad_right, window.shape[1]), dtype=window.dtype)
-                window = np.concatenate([window, padding], axis=0)
-            
+            # One clipped gather, then zero the rows that fall outside the sequence
+            idx = np.arange(frame_idx - context_size, frame_idx + context_size)
+            window = np.take(all_features, idx.clip(0, all_features.shape[0] - 1), axis=0)
+            window[(idx < 0) | (idx >= all_features.shape[0])] = 0
             return window
         
         # Test middle frame
@@ -137,35 +288,90 @@ class TestAudioEncoderWrapper:
         # Test first frame (needs padding)
         window = get_audio_features_for_frame(features, 0)
         assert window.shape == (16, 512)
+        assert not window[:8].any()
+        assert np.array_equal(window[8:], features[:8])
         
         # Test last frame (needs padding)
         window = get_audio_features_for_frame(features, n_frames - 1)
         assert window.shape == (16, 512)
+        assert np.array_equal(window[:9], features[-9:])
+        assert not window[9:].any()
+    
+    def test_wrapper_feature_windows(self, wrapper):
+        """Test that wrapper windows match explicit zero padding at every frame."""
+        n_frames = 20
+        features = _FEATURES[:n_frames]
+        expected = np.concatenate([
+            np.zeros((8, 512), dtype=np.float32),
+            features,
+            np.zeros((8, 512), dtype=np.float32)
+        ])
+        
+        windows = wrapper.get_audio_feature_windows(features)
+        assert windows.shape == (n_frames, 16, 512)
+        
+        for frame_idx in [0, 3, 10, n_frames - 1]:
+            window = wrapper.get_audio_features_for_frame(features, frame_idx)
+            assert window.shape == (16, 512)
+            assert np.array_equal(window, expected[frame_idx:frame_idx + 16])
+            assert np.array_equal(windows[frame_idx], window)
+    
+    def test_reshape_windows_for_model(self, tmp_checkpoint):
+        """Test that batched reshaping matches reshaping each window."""
+        features = _FEATURES[:20]
+        for mode in ["ave", "hubert"]:
+            wrapper = AudioEncoderWrapper(tmp_checkpoint, device="cpu", mode=mode)
+            windows = wrapper.get_audio_feature_windows(features)
+            
+            reshaped = wrapper.reshape_windows_for_model(windows)
+            
+            assert reshaped.shape[0] == 20
+            for i in [0, 7, 19]:
+                assert np.array_equal(reshaped[i], wrapper.reshape_for_model(windows[i]))
+    
+    def test_wrapper_reshape_reuses_buffer(self, tmp_checkpoint):
+        """Test that padded reshaping reuses its buffer and keeps the tail zeroed."""
+        wrapper = AudioEncoderWrapper(tmp_checkpoint, device="cpu", mode="hubert")
+        
+        first = wrapper.reshape_for_model(np.ones((16, 512), dtype=np.float32))
+        assert first.shape == (32, 32, 32)
+        assert first.sum() == 16 * 512
+        
+        second = wrapper.reshape_for_model(np.full((8, 512), 2.0, dtype=np.float32))
+        assert np.shares_memory(first, second)
+        assert second.sum() == 8 * 512 * 2.0
     
     def test_reshape_for_model(self):
         """Test reshaping features for different modes."""
         # Create dummy feature window
-        features = np.random.randn(16, 512).astype(np.float32)
+        features = _FEATURES[:16]
         
-        # Test AVE mode
-        flat = features.flatten()
-        ave_shape = flat.reshape(32, 16, 16)
+        # Test AVE mode (no padding: a view of the contiguous window)
+        flat = features.reshape(-1)
+        ave_shape = features.reshape(32, 16, 16)
         assert ave_shape.shape == (32, 16, 16)
         assert ave_shape.size == 8192
+        assert np.shares_memory(ave_shape, features)
+        
+        # Hubert and WeNet (need padding) share one buffer sized for the larger
+        # mode; only its tail is zeroed, the head is overwritten by the window
+        wenet_size = 256 * 16 * 32
+        buf = np.empty(wenet_size, dtype=flat.dtype)
+        buf[:flat.size] = flat
+        buf[flat.size:] = 0
         
         # Test Hubert mode (needs padding)
         hubert_size = 32 * 32 * 32
-        hubert_padded = np.zeros(hubert_size, dtype=flat.dtype)
-        hubert_padded[:flat.shape[0]] = flat
-        hubert_shape = hubert_padded.reshape(32, 32, 32)
+        hubert_shape = buf[:hubert_size].reshape(32, 32, 32)
         assert hubert_shape.shape == (32, 32, 32)
         
         # Test WeNet mode (needs padding)
-        wenet_size = 256 * 16 * 32
-        wenet_padded = np.zeros(wenet_size, dtype=flat.dtype)
-        wenet_padded[:flat.shape[0]] = flat
-        wenet_shape = wenet_padded.reshape(256, 16, 32)
+        wenet_shape = buf.reshape(256, 16, 32)
         assert wenet_shape.shape == (256, 16, 32)
+        
+        for reshaped in [hubert_shape, wenet_shape]:
+            assert np.array_equal(reshaped.reshape(-1)[:flat.size], flat)
+            assert not reshaped.reshape(-1)[flat.size:].any()
 
 
 def test_model_architecture():
@@ -179,9 +385,10 @@ def test_model_architecture():
     # Test with typical input
     x = torch.randn(1, 1, 80, 16)
     
-    model.eval()
-    with torch.no_grad():
-        output = model(x)
+    scripted = script_encoder(model)
+    with torch.jit.optimized_execution(True), torch.no_grad():
+        output = scripted(x)
+        assert torch.allclose(output, model(x), atol=1e-5)
     
     print(f"Input shape: {x.shape}")
     print(f"Output shape: {output.shape}")
@@ -15,15 +15,29 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from audio_pipeline.mel_processor import MelSpectrogramProcessor
 
+# Deterministic inputs generated once and shared (read-only) by the tests
+_RNG = np.random.default_rng(0)
+_WAV_16K = _RNG.standard_normal(16000, dtype=np.float32)
+_MEL_80X100 = _RNG.standard_normal((80, 100), dtype=np.float32)
+_WAV_16K.setflags(write=False)
+_MEL_80X100.setflags(write=False)
+
+
+@pytest.fixture(scope="module")
+def processor():
+    """
+    Create a MelSpectrogramProcessor instance shared by the module's tests.
+    
+    Building the mel filter bank, window and FFT plan is the expensive part,
+    and processing audio doesn't change the processor's state. Tests that
+    need other parameters or a cache directory build their own.
+    """
+    return MelSpectrogramProcessor()
+
 
 class TestMelSpectrogramProcessor:
     """Test suite for mel spectrogram processing."""
     
-    @pytest.fixture
-    def processor(self):
-        """Create a MelSpectrogramProcessor instance."""
-        return MelSpectrogramProcessor()
-    
     def test_initialization(self, processor):
         """Test that processor initializes with correct parameters."""
         assert processor.sample_rate == 16000
@@ -49,6 +63,39 @@ class TestMelSpectrogramProcessor:
         
         # First sample should be unchanged
         assert filtered[0] == wav[0]
+        
+        # Filtering in blocks with the carried state matches one pass
+        blocks = np.concatenate([
+            processor.preemphasis(wav[:2]),
+            processor.preemphasis(wav[2:], prev_sample=wav[1])
+        ])
+        assert np.array_equal(blocks, filtered)
+        
+        # The compiled kernel matches the textbook FIR filter on a real-length signal
+        from scipy.signal import lfilter
+        wav = _WAV_16K
+        expected = lfilter([1.0, -processor.preemphasis_coef], [1.0], wav.astype(np.float64))
+        assert np.allclose(processor.preemphasis(wav), expected, atol=1e-6)
+    
+    def test_window(self, processor):
+        """Test that the analysis window is built once as a periodic float32 Hann."""
+        from scipy.signal import windows
+        expected = windows.hann(800, sym=False)
+        
+        assert processor._window.dtype == np.float32
+        assert np.allclose(processor._window, expected, atol=1e-7)
+    
+    def test_stft_matches_librosa(self, processor):
+        """Test that the framed rfft STFT matches librosa.stft."""
+        import librosa
+        wav = _WAV_16K
+        
+        D = processor._stft(wav)
+        expected = librosa.stft(y=wav, n_fft=800, hop_length=200, win_length=800)
+        
+        assert D.shape == expected.shape
+        assert D.dtype == np.complex64
+        assert np.allclose(D, expected, atol=1e-4)
     
     def test_mel_basis_shape(self, processor):
         """Test mel filter bank shape."""
@@ -57,14 +104,19 @@ class TestMelSpectrogramProcessor:
         # Should be (n_mels, n_fft//2 + 1)
         expected_shape = (80, 401)
         assert mel_basis.shape == expected_shape
+        
+        # float32 and C-contiguous, so the projection is a single sgemm
+        assert mel_basis.dtype == np.float32
+        assert mel_basis.flags.c_contiguous
     
     def test_process_audio_shape(self, processor):
         """Test that process_audio returns correct shape."""
         # Generate 1 second of audio
         duration = 1.0
-        wav = np.random.randn(int(processor.sample_rate * duration)).astype(np.float32)
+        wav = _WAV_16K[:int(processor.sample_rate * duration)]
         
         mel_spec = processor.process_audio(wav)
+        assert mel_spec.dtype == np.float32
         
         # Check that output has correct number of mel bands
         assert mel_spec.shape[0] == 80
@@ -76,7 +128,7 @@ class TestMelSpectrogramProcessor:
     def test_normalization_range(self, processor):
         """Test that normalized mel spectrogram is in expected range."""
         # Generate audio
-        wav = np.random.randn(16000).astype(np.float32)
+        wav = _WAV_16K
         mel_spec = processor.process_audio(wav)
         
         # Should be clipped to [-4, 4]
@@ -86,29 +138,57 @@ class TestMelSpectrogramProcessor:
     def test_crop_audio_window(self, processor):
         """Test audio window cropping."""
         # Create a dummy mel spectrogram
-        mel_spec = np.random.randn(80, 100).astype(np.float32)
+        mel_spec = _MEL_80X100
         
         # Crop window for frame 0
         window = processor.crop_audio_window(mel_spec, frame_idx=0, fps=25)
         
         # Should have shape (16, 80)
         assert window.shape == (16, 80)
+        
+        # Each crop is already a strided view: no copy to cache or avoid
+        all_windows = np.lib.stride_tricks.sliding_window_view(mel_spec, 16, axis=1)
+        for frame_idx in [0, 5, 20]:
+            window = processor.crop_audio_window(mel_spec, frame_idx=frame_idx, fps=25)
+            start = int(80.0 * frame_idx / 25)
+            assert np.shares_memory(window, mel_spec)
+            assert np.array_equal(window, all_windows[:, start].T)
     
     def test_crop_audio_window_boundary(self, processor):
         """Test audio window cropping at boundaries."""
         # Create a small mel spectrogram
-        mel_spec = np.random.randn(80, 20).astype(np.float32)
+        mel_spec = _MEL_80X100[:, :20]
         
         # Try to crop near the end
         window = processor.crop_audio_window(mel_spec, frame_idx=10, fps=25)
         
         # Should still return (16, 80)
         assert window.shape == (16, 80)
+        assert np.array_equal(window, mel_spec[:, -16:].T)
+        
+        # Too short for any window
+        with pytest.raises(ValueError):
+            processor.crop_audio_window(mel_spec[:, :10], frame_idx=0, fps=25)
+    
+    def test_crop_audio_windows(self, processor):
+        """Test that batched cropping matches cropping each frame on its own."""
+        mel_spec = _MEL_80X100
+        n_frames = processor.get_frame_count(mel_spec, fps=25)
+        
+        windows = processor.crop_audio_windows(mel_spec, n_frames, fps=25)
+        
+        assert windows.shape == (n_frames, 16, 80)
+        for i in range(n_frames):
+            assert np.array_equal(windows[i], processor.crop_audio_window(mel_spec, i, fps=25))
+        
+        out = np.empty((n_frames, 16, 80), dtype=np.float32)
+        assert processor.crop_audio_windows(mel_spec, n_frames, fps=25, out=out) is out
+        assert np.array_equal(out, windows)
     
     def test_frame_count_calculation(self, processor):
         """Test frame count calculation."""
         # Create mel spec with 100 frames
-        mel_spec = np.random.randn(80, 100).astype(np.float32)
+        mel_spec = _MEL_80X100
         
         frame_count = processor.get_frame_count(mel_spec, fps=25)
         
@@ -117,29 +197,72 @@ class TestMelSpectrogramProcessor:
         expected = int((100 - 16) / 80.0 * 25) + 2
         assert frame_count == expected
     
+    def test_stream_matches_process_audio(self, processor):
+        """Test that streaming mel blocks concatenate to the offline result."""
+        wav = _WAV_16K
+        expected = processor.process_audio(wav)
+        
+        # Uneven chunk sizes, including ones shorter than a hop
+        bounds = [0, 150, 1000, 1100, 7777, 16000]
+        chunks = [wav[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+        streamed = np.concatenate(list(processor.stream(chunks)), axis=1)
+        
+        assert streamed.shape == expected.shape
+        assert np.allclose(streamed, expected, atol=1e-5)
+    
+    def test_process_audio_torch(self, processor):
+        """Test that the torch (GPU-capable) path matches process_audio."""
+        import torch
+        expected = processor.process_audio(_WAV_16K)
+        
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        mel = processor.process_audio_torch(torch.from_numpy(_WAV_16K.copy()).to(device))
+        
+        assert mel.dtype == torch.float32
+        assert mel.shape == expected.shape
+        np.testing.assert_allclose(mel.cpu().numpy(), expected, atol=1e-4)
+    
+    def test_process_file_cache(self, tmp_path, monkeypatch):
+        """Test that process_file reuses cached mel spectrograms for unchanged audio."""
+        import soundfile as sf
+        audio_path = tmp_path / "audio.wav"
+        sf.write(audio_path, 0.1 * _WAV_16K, 16000)
+        processor = MelSpectrogramProcessor(cache_dir=str(tmp_path / "cache"))
+        
+        mel_spec = processor.process_file(str(audio_path))
+        assert len(list((tmp_path / "cache").glob("*.npy"))) == 1
+        
+        # A cache hit must not recompute the spectrogram
+        monkeypatch.setattr(processor, "process_audio", lambda wav: pytest.fail("cache miss"))
+        assert np.array_equal(processor.process_file(str(audio_path)), mel_spec)
+        
+        # Different parameters must not share the cached result
+        other = MelSpectrogramProcessor(n_mels=40, cache_dir=str(tmp_path / "cache"))
+        assert other.process_file(str(audio_path)).shape[0] == 40
+    
     def test_save_load_mel_spectrogram(self, processor, tmp_path):
         """Test saving and loading mel spectrograms."""
         # Generate mel spectrogram
-        wav = np.random.randn(16000).astype(np.float32)
+        wav = _WAV_16K
         mel_spec = processor.process_audio(wav)
         
         # Save
         save_path = tmp_path / "test_mel.npy"
         processor.save_mel_spectrogram(mel_spec, str(save_path))
         
-        # Load
-        loaded_mel = processor.load_mel_spectrogram(str(save_path))
+        # Load (memory-mapped, as the reference dataset is read)
+        loaded_mel = processor.load_mel_spectrogram(str(save_path), mmap=True)
+        assert isinstance(loaded_mel, np.memmap)
         
         # Should be identical
-        assert np.allclose(mel_spec, loaded_mel)
+        assert np.array_equal(mel_spec, loaded_mel)
 
 
-def test_synthetic_audio():
+def test_synthetic_audio(processor):
     """
     Test with synthetic audio to verify exact behavior.
     This can be used as a reference for iOS implementation.
     """
-    processor = MelSpectrogramProcessor()
     
     # Generate a simple sine wave at 440 Hz (A4 note)
     duration = 0.5  # seconds
@@ -167,17 +290,17 @@ def test_synthetic_audio():
 
 
 if __name__ == "__main__":
-    # Run a simple test
-    test_synthetic_audio()
-    
     # Run basic tests without pytest
     processor = MelSpectrogramProcessor()
     
+    # Run a simple test
+    test_synthetic_audio(processor)
+    
     # Test 1: Initialization
     print("\n✓ Processor initialized")
     
     # Test 2: Process audio
-    wav = np.random.randn(16000).astype(np.float32)
+    wav = _WAV_16K
     mel_spec = processor.process_audio(wav)
     print(f"✓ Processed audio: {mel_spec.shape}")
     
@@ -6,15 +6,24 @@ for iOS implementation validation.
 """
 
 import numpy as np
+import pytest
 import sys
 from pathlib import Path
 import json
+import logging
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
+from audio_pipeline.audio_encoder import COMPILE_WARMUP_BATCH
 from audio_pipeline.pipeline import AudioPipeline
 
+try:
+    import numexpr
+    NUMEXPR_AVAILABLE = True
+except ImportError:
+    NUMEXPR_AVAILABLE = False
+
 
 def create_test_audio(output_path: str, duration: float = 1.0, sr: int = 16000):
     """
@@ -29,16 +38,28 @@ def create_test_audio(output_path: str, duration: float = 1.0, sr: int = 16000):
     
     # Generate a simple audio signal (mix of sine waves)
     t = np.linspace(0, duration, int(sr * duration))
+    noise = np.random.randn(len(t))
     
-    # Mix of frequencies to create richer audio
-    audio = (
-        0.3 * np.sin(2 * np.pi * 440 * t) +  # A4
-        0.2 * np.sin(2 * np.pi * 554.37 * t) +  # C#5
-        0.1 * np.sin(2 * np.pi * 659.25 * t)  # E5
-    )
-    
-    # Add some noise
-    audio += 0.05 * np.random.randn(len(audio))
+    # Mix of frequencies (A4, C#5, E5) to create richer audio, plus some noise
+    if NUMEXPR_AVAILABLE:
+        # One fused pass over the samples instead of one per term
+        audio = numexpr.evaluate(
+            "0.3 * sin(w1 * t) + 0.2 * sin(w2 * t) + 0.1 * sin(w3 * t) + 0.05 * noise",
+            local_dict={
+                'w1': 2 * np.pi * 440,
+                'w2': 2 * np.pi * 554.37,
+                'w3': 2 * np.pi * 659.25,
+                't': t,
+                'noise': noise,
+            }
+        )
+    else:
+        audio = (
+            0.3 * np.sin(2 * np.pi * 440 * t) +
+            0.2 * np.sin(2 * np.pi * 554.37 * t) +
+            0.1 * np.sin(2 * np.pi * 659.25 * t) +
+            0.05 * noise
+        )
     
     # Normalize
     audio = audio / np.abs(audio).max() * 0.9
@@ -51,6 +72,42 @@ def create_test_audio(output_path: str, duration: float = 1.0, sr: int = 16000):
     return output_path
 
 
+def test_compiled_encoder_reused(tmp_checkpoint):
+    """The warm-up in __init__ compiles the encoder; later batches must reuse that graph."""
+    from torch._dynamo.utils import counters
+    
+    pipeline = AudioPipeline(checkpoint_path=tmp_checkpoint, device="cpu", compile_model=True)
+    if not pipeline.audio_encoder.compiled:
+        pytest.skip("torch.compile is not available for this device")
+    
+    n_graphs = counters["stats"]["unique_graphs"]
+    mel_windows = np.zeros((COMPILE_WARMUP_BATCH, 16, 80), dtype=np.float32)
+    pipeline.audio_encoder.process_mel_windows(mel_windows)
+    assert counters["stats"]["unique_graphs"] == n_graphs
+
+
+@pytest.mark.parametrize("mode", ["ave", "hubert"])
+@pytest.mark.parametrize("reshape", [True, False])
+def test_all_frame_features_match_per_frame(tmp_checkpoint, mode, reshape):
+    """Batched frame features must equal get_frame_features, including the zero-padded edges."""
+    pipeline = AudioPipeline(checkpoint_path=tmp_checkpoint, device="cpu", mode=mode, compile_model=False)
+    n_frames = 20
+    audio_features = np.random.default_rng(0).standard_normal((n_frames, 512), dtype=np.float32)
+    
+    all_features = pipeline.get_all_frame_features(audio_features, reshape=reshape)
+    assert all_features.shape[0] == n_frames
+    
+    # Context windows reach 8 frames past either end, so 0-7 and 12-19 are padded
+    for frame_idx in [0, 1, 7, 8, 10, 12, n_frames - 2, n_frames - 1]:
+        expected = pipeline.get_frame_features(audio_features, frame_idx, reshape=reshape)
+        assert np.array_equal(all_features[frame_idx], expected)
+    
+    # n_frames keeps only the leading frames
+    assert np.array_equal(
+        pipeline.get_all_frame_features(audio_features, 5, reshape=reshape), all_features[:5]
+    )
+
+
 def test_pipeline_basic():
     """Test basic pipeline functionality."""
     print("\n" + "="*60)
@@ -78,6 +135,7 @@ def test_pipeline_basic():
         return False
 
 
+@pytest.mark.serial
 def test_pipeline_with_real_audio():
     """Test pipeline with real audio from the demo folder."""
     print("\n" + "="*60)
@@ -201,7 +259,7 @@ def generate_reference_dataset():
                 "1. Implement mel spectrogram processing on iOS",
                 "2. Load reference_audio.wav and compare your mel output with mel_spectrogram.npy",
                 "3. Implement AudioEncoder model (convert to CoreML)",
-                "4. Compare per-frame outputs with frames/frame_XXXXX_reshaped.npy",
+                "4. Compare per-frame outputs with the rows of frames_reshaped.npy",
                 "5. Ensure numerical differences are < 1e-4 (accounting for floating point)"
             ],
             "files": {
@@ -210,7 +268,8 @@ def generate_reference_dataset():
                 "mel_windows.npy": "Reference windowed mel features",
                 "audio_features_raw.npy": "Reference AudioEncoder outputs (no padding)",
                 "audio_features_padded.npy": "Reference features with temporal padding",
-                "frames/": "Per-frame features for each video frame",
+                "frames_window.npy": "Per-frame temporal windows, one row per video frame",
+                "frames_reshaped.npy": "Per-frame model inputs, one row per video frame",
                 "metadata.json": "Processing metadata",
                 "summary.json": "Dataset summary"
             },
@@ -234,7 +293,7 @@ def generate_reference_dataset():
         print("  - reference_audio.wav (test audio)")
         print("  - mel_spectrogram.npy (mel spectrogram)")
         print("  - audio_features_padded.npy (encoded features)")
-        print("  - frames/ (per-frame features)")
+        print("  - frames_reshaped.npy (per-frame features)")
         print("  - VALIDATION_INSTRUCTIONS.json")
         print("\nUse these files to validate your iOS implementation!")
         
@@ -270,6 +329,8 @@ def compare_with_original():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    
     print("\n" + "="*60)
     print("Audio Pipeline Integration Tests")
     print("="*60)
@@ -0,0 +1,64 @@
+"""
+Unit tests for validate_ios_port
+
+These tests check that non-finite test outputs fail validation instead of
+slipping under the tolerance.
+"""
+
+import numpy as np
+import pytest
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from audio_pipeline import validate_ios_port
+
+
+def _write_pair(tmp_path: Path, filename: str, reference: np.ndarray, test: np.ndarray):
+    """Save reference/test arrays under tmp_path/ref and tmp_path/test."""
+    ref_dir = tmp_path / "ref"
+    test_dir = tmp_path / "test"
+    ref_dir.mkdir()
+    test_dir.mkdir()
+    np.save(ref_dir / filename, reference)
+    np.save(test_dir / filename, test)
+    return ref_dir, test_dir
+
+
+@pytest.fixture(params=["numba", "numpy"])
+def backend(request, monkeypatch):
+    """Run a test through the numba kernel and through the chunked numpy path."""
+    if request.param == "numba":
+        if not validate_ios_port.NUMBA_AVAILABLE:
+            pytest.skip("numba not installed")
+    else:
+        monkeypatch.setattr(validate_ios_port, "NUMBA_AVAILABLE", False)
+    return request.param
+
+
+@pytest.mark.parametrize("bad_value", [np.nan, np.inf])
+def test_non_finite_output_fails(tmp_path, backend, bad_value):
+    """A NaN or inf anywhere in the test output must fail validation."""
+    reference = np.zeros((80, 100), dtype=np.float32)
+    test = reference.copy()
+    test[40, 50] = bad_value
+    ref_dir, test_dir = _write_pair(tmp_path, "mel_spectrogram.npy", reference, test)
+
+    passed, metrics = validate_ios_port.validate_mel_spectrogram(ref_dir, test_dir)
+
+    assert not passed
+    assert not np.isfinite(metrics['max_abs_diff'])
+
+
+def test_all_nan_frames_fail(tmp_path, backend):
+    """All-NaN frames must not aggregate to a passing max difference."""
+    reference = np.zeros((4, 32, 16, 16), dtype=np.float32)
+    test = np.full_like(reference, np.nan)
+    ref_dir, test_dir = _write_pair(tmp_path, "frames_reshaped.npy", reference, test)
+
+    passed, metrics = validate_ios_port.validate_frame_features(ref_dir, test_dir, num_frames=4)
+
+    assert not passed
+    assert np.isnan(metrics['max_abs_diff'])
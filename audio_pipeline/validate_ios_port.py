@@ -10,15 +10,124 @@ Usage:
 """
 
 import numpy as np
+import os
 import sys
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Tuple, Dict
+from typing import Optional, Tuple, Dict
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
 
-def load_numpy_array(path: str) -> np.ndarray:
-    """Load a numpy array from file."""
-    return np.load(path)
+
+def load_numpy_array(path: str, mmap: bool = False) -> np.ndarray:
+    """Load a numpy array from file (memory-mapped read-only if mmap is True)."""
+    return np.load(path, mmap_mode='r' if mmap else None)
+
+
+if NUMBA_AVAILABLE:
+    # No fastmath: it lets LLVM assume finite values, and NaN/inf differences
+    # must reach the tolerance check rather than be dropped
+    @njit(nogil=True, cache=True)
+    def _fused_difference_stats(reference, test, abs_diff):
+        """
+        One pass over flat reference/test: writes |reference - test| into
+        abs_diff and returns (max, sum, sum of squares) of it and (max, sum)
+        of the relative difference. A NaN difference makes both maxima NaN.
+        Releases the GIL, so callers parallelize across arrays with threads.
+        """
+        max_abs = 0.0
+        sum_abs = 0.0
+        sumsq_abs = 0.0
+        max_rel = 0.0
+        sum_rel = 0.0
+        for i in range(reference.shape[0]):
+            ref = float(reference[i])
+            d = abs(ref - float(test[i]))
+            abs_diff[i] = d
+            rel = d / (abs(ref) + 1e-8)
+            # d != d is the NaN test; once a maximum is NaN, d > NaN keeps it
+            if d != d or d > max_abs:
+                max_abs = d
+            sum_abs += d
+            sumsq_abs += d * d
+            if rel != rel or rel > max_rel:
+                max_rel = rel
+            sum_rel += rel
+        return max_abs, sum_abs, sumsq_abs, max_rel, sum_rel
+
+
+# Elements per chunk of the numpy compute_difference path (1 MB of float32)
+DIFF_CHUNK = 1 << 18
+
+# Per-frame metrics cache, kept next to validation_results.json in the test dir
+METRICS_CACHE_FILENAME = "validation_cache.json"
+
+
+def file_stat(path: Path) -> list:
+    """(size, mtime_ns) of a file, as a JSON-friendly list."""
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def load_metrics_cache(test_dir: Path) -> Dict:
+    """
+    Load cached per-frame metrics from a previous run.
+    
+    Args:
+        test_dir: Test output directory holding the cache file
+        
+    Returns:
+        Cache dict (empty if missing or unreadable)
+    """
+    cache_file = test_dir / METRICS_CACHE_FILENAME
+    try:
+        with open(cache_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_metrics_cache(test_dir: Path, cache: Dict):
+    """Write the per-frame metrics cache back to the test directory."""
+    with open(test_dir / METRICS_CACHE_FILENAME, 'w') as f:
+        json.dump(_normalize(cache), f)
+
+
+def _chunked_difference_stats(reference: np.ndarray, test: np.ndarray, abs_diff: np.ndarray) -> Tuple:
+    """
+    Numpy counterpart of _fused_difference_stats. Streams the flat inputs in
+    DIFF_CHUNK-sized pieces so the relative difference and squares only ever
+    live in one cache-sized scratch buffer. np.maximum, unlike max(), keeps a
+    NaN chunk maximum.
+    """
+    n = reference.shape[0]
+    scratch = np.empty(min(DIFF_CHUNK, n), dtype=abs_diff.dtype)
+    max_abs = sum_abs = sumsq_abs = max_rel = sum_rel = 0.0
+    
+    for start in range(0, n, DIFF_CHUNK):
+        stop = min(start + DIFF_CHUNK, n)
+        chunk = abs_diff[start:stop]
+        np.subtract(reference[start:stop], test[start:stop], out=chunk)
+        np.abs(chunk, out=chunk)
+        max_abs = np.maximum(max_abs, chunk.max())
+        sum_abs += float(chunk.sum(dtype=np.float64))
+        
+        rel = scratch[:stop - start]
+        np.abs(reference[start:stop], out=rel)
+        rel += 1e-8
+        np.divide(chunk, rel, out=rel)
+        max_rel = np.maximum(max_rel, rel.max())
+        sum_rel += float(rel.sum(dtype=np.float64))
+        
+        np.multiply(chunk, chunk, out=rel)
+        sumsq_abs += float(rel.sum(dtype=np.float64))
+    
+    return max_abs, sum_abs, sumsq_abs, max_rel, sum_rel
 
 
 def compute_difference(reference: np.ndarray, test: np.ndarray) -> Dict[str, float]:
@@ -34,28 +143,61 @@ def compute_difference(reference: np.ndarray, test: np.ndarray) -> Dict[str, flo
             'error': f'Shape mismatch: reference={reference.shape}, test={test.shape}'
         }
     
-    # Compute metrics
-    abs_diff = np.abs(reference - test)
+    if reference.size == 0:
+        return {'error': 'Empty arrays'}
+    
+    # All reductions but the median in one pass; abs_diff is kept whole only
+    # for the median
+    reference_flat = reference.reshape(-1)
+    test_flat = test.reshape(-1)
+    abs_diff = np.empty(reference_flat.shape, dtype=np.result_type(reference, test))
+    if NUMBA_AVAILABLE:
+        stats = _fused_difference_stats(
+            np.ascontiguousarray(reference_flat), np.ascontiguousarray(test_flat), abs_diff
+        )
+    else:
+        stats = _chunked_difference_stats(reference_flat, test_flat, abs_diff)
+    max_abs, sum_abs, sumsq_abs, max_rel, sum_rel = stats
     
+    n = abs_diff.size
+    mean_abs = sum_abs / n
     metrics = {
-        'max_abs_diff': float(np.max(abs_diff)),
-        'mean_abs_diff': float(np.mean(abs_diff)),
-        'median_abs_diff': float(np.median(abs_diff)),
-        'std_abs_diff': float(np.std(abs_diff)),
-        'max_rel_diff': float(np.max(abs_diff / (np.abs(reference) + 1e-8))),
-        'mean_rel_diff': float(np.mean(abs_diff / (np.abs(reference) + 1e-8))),
+        'max_abs_diff': float(max_abs),
+        'mean_abs_diff': float(mean_abs),
+        'median_abs_diff': float(np.median(abs_diff, overwrite_input=True)),
+        'std_abs_diff': float(np.sqrt(max(sumsq_abs / n - mean_abs * mean_abs, 0.0))),
+        'max_rel_diff': float(max_rel),
+        'mean_rel_diff': float(sum_rel / n),
     }
     
     return metrics
 
 
-def validate_mel_spectrogram(ref_dir: Path, test_dir: Path) -> Tuple[bool, Dict]:
-    """Validate mel spectrogram output."""
-    print("\nValidating Mel Spectrogram...")
+def _validate_npy(
+    ref_dir: Path,
+    test_dir: Path,
+    filename: str,
+    label: str,
+    tolerance: float = 1e-3
+) -> Tuple[bool, Dict]:
+    """
+    Validate one whole-array .npy output against the reference.
+    
+    Args:
+        ref_dir: Reference output directory
+        test_dir: Test output directory
+        filename: .npy file name present in both directories
+        label: Human-readable name for the printed header
+        tolerance: Maximum allowed absolute difference
+        
+    Returns:
+        Tuple of (passed, metrics)
+    """
+    print(f"\nValidating {label}...")
     print("-" * 60)
     
-    ref_path = ref_dir / "mel_spectrogram.npy"
-    test_path = test_dir / "mel_spectrogram.npy"
+    ref_path = ref_dir / filename
+    test_path = test_dir / filename
     
     if not ref_path.exists():
         return False, {'error': f'Reference file not found: {ref_path}'}
@@ -63,8 +205,8 @@ def validate_mel_spectrogram(ref_dir: Path, test_dir: Path) -> Tuple[bool, Dict]
     if not test_path.exists():
         return False, {'error': f'Test file not found: {test_path}'}
     
-    reference = load_numpy_array(str(ref_path))
-    test = load_numpy_array(str(test_path))
+    reference = load_numpy_array(str(ref_path), mmap=True)
+    test = load_numpy_array(str(test_path), mmap=True)
     
     print(f"Reference shape: {reference.shape}")
     print(f"Test shape:      {test.shape}")
@@ -82,7 +224,6 @@ def validate_mel_spectrogram(ref_dir: Path, test_dir: Path) -> Tuple[bool, Dict]
         print(f"  {key}: {value:.6f}")
     
     # Check tolerance
-    tolerance = 1e-3  # More lenient for mobile implementations
     passed = metrics['max_abs_diff'] < tolerance
     
     if passed:
@@ -93,91 +234,102 @@ def validate_mel_spectrogram(ref_dir: Path, test_dir: Path) -> Tuple[bool, Dict]
     return passed, metrics
 
 
+def validate_mel_spectrogram(ref_dir: Path, test_dir: Path) -> Tuple[bool, Dict]:
+    """Validate mel spectrogram output."""
+    # More lenient tolerance for mobile implementations
+    return _validate_npy(ref_dir, test_dir, "mel_spectrogram.npy", "Mel Spectrogram", tolerance=1e-3)
+
+
 def validate_audio_features(ref_dir: Path, test_dir: Path) -> Tuple[bool, Dict]:
     """Validate audio encoder output."""
-    print("\nValidating Audio Features...")
-    print("-" * 60)
-    
-    ref_path = ref_dir / "audio_features_padded.npy"
-    test_path = test_dir / "audio_features_padded.npy"
-    
-    if not ref_path.exists():
-        return False, {'error': f'Reference file not found: {ref_path}'}
-    
-    if not test_path.exists():
-        return False, {'error': f'Test file not found: {test_path}'}
-    
-    reference = load_numpy_array(str(ref_path))
-    test = load_numpy_array(str(test_path))
-    
-    print(f"Reference shape: {reference.shape}")
-    print(f"Test shape:      {test.shape}")
-    print(f"Reference range: [{reference.min():.3f}, {reference.max():.3f}]")
-    print(f"Test range:      [{test.min():.3f}, {test.max():.3f}]")
-    
-    metrics = compute_difference(reference, test)
-    
-    if 'error' in metrics:
-        print(f"✗ {metrics['error']}")
-        return False, metrics
-    
-    print(f"\nDifference Metrics:")
-    for key, value in metrics.items():
-        print(f"  {key}: {value:.6f}")
-    
-    # Check tolerance
-    tolerance = 1e-3
-    passed = metrics['max_abs_diff'] < tolerance
-    
-    if passed:
-        print(f"\n✓ PASSED (max diff {metrics['max_abs_diff']:.6f} < {tolerance})")
-    else:
-        print(f"\n✗ FAILED (max diff {metrics['max_abs_diff']:.6f} >= {tolerance})")
-    
-    return passed, metrics
+    return _validate_npy(ref_dir, test_dir, "audio_features_padded.npy", "Audio Features", tolerance=1e-3)
 
 
-def validate_frame_features(ref_dir: Path, test_dir: Path, num_frames: int = 10) -> Tuple[bool, Dict]:
-    """Validate per-frame features."""
+def validate_frame_features(
+    ref_dir: Path,
+    test_dir: Path,
+    num_frames: int = 10,
+    cache: Optional[Dict] = None
+) -> Tuple[bool, Dict]:
+    """
+    Validate per-frame features.
+    
+    The reference stores all frames in frames_reshaped.npy. The test output may
+    do the same, or provide one frames/frame_XXXXX_reshaped.npy file per frame.
+    
+    If cache is given, a frame whose reference and test files have the same
+    size and mtime as in a previous run reuses that run's metrics, and newly
+    computed metrics are added to it.
+    """
     print(f"\nValidating Frame Features (sampling {num_frames} frames)...")
     print("-" * 60)
     
-    ref_frames_dir = ref_dir / "frames"
+    ref_path = ref_dir / "frames_reshaped.npy"
+    test_path = test_dir / "frames_reshaped.npy"
     test_frames_dir = test_dir / "frames"
     
-    if not ref_frames_dir.exists():
-        return False, {'error': f'Reference frames directory not found: {ref_frames_dir}'}
+    if not ref_path.exists():
+        return False, {'error': f'Reference frame features not found: {ref_path}'}
     
-    if not test_frames_dir.exists():
-        return False, {'error': f'Test frames directory not found: {test_frames_dir}'}
+    if not test_path.exists() and not test_frames_dir.exists():
+        return False, {'error': f'Test frame features not found: {test_path} or {test_frames_dir}'}
     
-    # Get list of frame files
-    ref_frame_files = sorted(ref_frames_dir.glob("frame_*_reshaped.npy"))
+    # Memory-mapped, so only the sampled frames are read from disk
+    ref_frames = np.load(ref_path, mmap_mode='r')
+    test_frames = np.load(test_path, mmap_mode='r') if test_path.exists() else None
     
-    if not ref_frame_files:
-        return False, {'error': 'No reference frame files found'}
+    if ref_frames.shape[0] == 0:
+        return False, {'error': 'No reference frames found'}
     
     # Sample frames evenly
-    total_frames = len(ref_frame_files)
+    total_frames = ref_frames.shape[0]
     sample_indices = np.linspace(0, total_frames - 1, min(num_frames, total_frames), dtype=int)
     
+    ref_stat = file_stat(ref_path) if cache is not None else None
+    test_stat = file_stat(test_path) if cache is not None and test_frames is not None else None
+    
+    def compare_frame(idx: int) -> Optional[Dict[str, float]]:
+        """Metrics for one sampled frame, or None if the test frame is missing."""
+        if test_frames is not None:
+            test_file = test_path
+            if idx >= test_frames.shape[0]:
+                return None
+        else:
+            test_file = test_frames_dir / f"frame_{idx:05d}_reshaped.npy"
+            if not test_file.exists():
+                return None
+        
+        if cache is not None:
+            key = f"{ref_path}|{test_file}|{idx}"
+            stats = [ref_stat, test_stat if test_stat is not None else file_stat(test_file)]
+            entry = cache.get(key)
+            if entry is not None and entry['stats'] == stats:
+                return entry['metrics']
+        
+        if test_frames is not None:
+            test = test_frames[idx]
+        else:
+            test = load_numpy_array(str(test_file), mmap=True)
+        metrics = compute_difference(ref_frames[idx], test)
+        
+        if cache is not None:
+            cache[key] = {'stats': stats, 'metrics': metrics}
+        return metrics
+    
+    # Frames are independent, and page-ins and numpy reductions release the
+    # GIL, so threads overlap them; map() keeps the results in frame order
+    with ThreadPoolExecutor(max_workers=min(len(sample_indices), os.cpu_count() or 1)) as executor:
+        frame_metrics = list(executor.map(compare_frame, sample_indices))
+    
     all_metrics = []
     failed_frames = []
     
-    for idx in sample_indices:
-        ref_file = ref_frame_files[idx]
-        test_file = test_frames_dir / ref_file.name
-        
-        if not test_file.exists():
-            print(f"✗ Frame {idx}: Test file not found")
+    for idx, metrics in zip(sample_indices, frame_metrics):
+        if metrics is None:
+            print(f"✗ Frame {idx}: Test frame not found")
             failed_frames.append(idx)
             continue
         
-        reference = load_numpy_array(str(ref_file))
-        test = load_numpy_array(str(test_file))
-        
-        metrics = compute_difference(reference, test)
-        
         if 'error' in metrics:
             print(f"✗ Frame {idx}: {metrics['error']}")
             failed_frames.append(idx)
@@ -192,7 +344,8 @@ def validate_frame_features(ref_dir: Path, test_dir: Path, num_frames: int = 10)
     
     # Compute aggregate metrics
     aggregate = {
-        'max_abs_diff': max(m['max_abs_diff'] for m in all_metrics),
+        # np.max, unlike max(), propagates a NaN frame into the aggregate
+        'max_abs_diff': float(np.max([m['max_abs_diff'] for m in all_metrics])),
         'mean_abs_diff': np.mean([m['mean_abs_diff'] for m in all_metrics]),
         'frames_tested': len(all_metrics),
         'frames_failed': len(failed_frames),
@@ -213,6 +366,27 @@ def validate_frame_features(ref_dir: Path, test_dir: Path, num_frames: int = 10)
     return passed, aggregate
 
 
+def _normalize(obj):
+    """
+    Recursively convert numpy types to Python types for JSON serialization.
+    
+    Args:
+        obj: Results value (dict, list, numpy scalar/array or plain Python)
+        
+    Returns:
+        Equivalent structure made only of JSON-serializable Python types
+    """
+    if isinstance(obj, dict):
+        return {key: _normalize(value) for key, value in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [_normalize(value) for value in obj]
+    elif isinstance(obj, np.ndarray):
+        return obj.tolist()
+    elif isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
 def main():
     if len(sys.argv) != 3:
         print("Usage: python validate_ios_port.py <reference_dir> <ios_output_dir>")
@@ -249,9 +423,11 @@ def main():
     passed, metrics = validate_audio_features(ref_dir, test_dir)
     results['audio_features'] = {'passed': passed, 'metrics': metrics}
     
-    # Validate frame features
-    passed, metrics = validate_frame_features(ref_dir, test_dir)
+    # Validate frame features, reusing metrics of frames unchanged since the last run
+    cache = load_metrics_cache(test_dir)
+    passed, metrics = validate_frame_features(ref_dir, test_dir, cache=cache)
     results['frame_features'] = {'passed': passed, 'metrics': metrics}
+    save_metrics_cache(test_dir, cache)
     
     # Summary
     print("\n" + "="*70)
@@ -268,20 +444,7 @@ def main():
     # Save results
     results_file = test_dir / "validation_results.json"
     with open(results_file, 'w') as f:
-        # Convert numpy types to Python types for JSON serialization
-        def convert(obj):
-            if isinstance(obj, np.integer):
-                return int(obj)
-            elif isinstance(obj, np.floating):
-                return float(obj)
-            elif isinstance(obj, np.ndarray):
-                return obj.tolist()
-            return obj
-        
-        serializable_results = json.loads(
-            json.dumps(results, default=convert)
-        )
-        json.dump(serializable_results, f, indent=2)
+        json.dump(_normalize(results), f, indent=2)
     
     print(f"\nResults saved to: {results_file}")
     
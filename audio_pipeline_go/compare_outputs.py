@@ -9,23 +9,31 @@ import struct
 import sys
 
 def load_go_bin_file(path):
-    """Load a binary file saved by Go."""
+    """
+    Load a frame file saved by Go.
+    
+    Files start with a JSON header line, {"len": N, "dtype": "f32le"}, followed
+    by N raw little-endian float32 values. Older files instead have a JSON
+    length line followed by one JSON-encoded float per line.
+    """
     with open(path, 'rb') as f:
-        # Read JSON-encoded length
-        length_line = f.readline()
-        length = json.loads(length_line)
+        header = json.loads(f.readline())
         
-        # Read JSON-encoded floats
-        data = []
-        for _ in range(length):
-            line = f.readline()
-            value = json.loads(line)
-            data.append(value)
+        if isinstance(header, dict):
+            if header.get('dtype') != 'f32le':
+                raise ValueError(f"Unsupported dtype in {path}: {header.get('dtype')}")
+            data = np.frombuffer(f.read(header['len'] * 4), dtype='<f4')
+        else:
+            # Legacy text format: header is the length; parse all values in one call
+            data = np.array(f.read().split()[:header], dtype=np.float32)
+            header = {'len': header}
         
-        return np.array(data, dtype=np.float32)
+        if data.size != header['len']:
+            raise ValueError(f"Truncated frame file {path}: {data.size} of {header['len']} values")
+        return data
 
-def compare_mel_spec(py_path, go_metadata_path):
-    """Compare mel spectrograms."""
+def compare_mel_spec(py_path, go_meta):
+    """Compare mel spectrograms against the parsed Go metadata.json."""
     print("\n" + "="*70)
     print("Comparing Mel Spectrograms")
     print("="*70)
@@ -35,10 +43,6 @@ def compare_mel_spec(py_path, go_metadata_path):
     print(f"Python mel shape: {py_mel.shape}")
     print(f"Python mel range: [{py_mel.min():.4f}, {py_mel.max():.4f}]")
     
-    # Load Go metadata
-    with open(go_metadata_path) as f:
-        go_meta = json.load(f)
-    
     go_shape = go_meta['stats']['mel_shape']
     go_range = go_meta['stats']['mel_range']
     
@@ -65,8 +69,8 @@ def compare_mel_spec(py_path, go_metadata_path):
     else:
         print(f"✗ Ranges differ significantly")
 
-def compare_audio_features(py_path, go_metadata_path):
-    """Compare audio encoder outputs."""
+def compare_audio_features(py_path, go_meta):
+    """Compare audio encoder outputs against the parsed Go metadata.json."""
     print("\n" + "="*70)
     print("Comparing Audio Features")
     print("="*70)
@@ -76,10 +80,6 @@ def compare_audio_features(py_path, go_metadata_path):
     print(f"Python features shape: {py_features.shape}")
     print(f"Python features range: [{py_features.min():.4f}, {py_features.max():.4f}]")
     
-    # Load Go metadata
-    with open(go_metadata_path) as f:
-        go_meta = json.load(f)
-    
     go_shape = go_meta['stats']['features_shape']
     go_range = go_meta['stats']['features_range']
     
@@ -108,10 +108,8 @@ def compare_audio_features(py_path, go_metadata_path):
         print(f"⚠ Ranges differ")
         return False
 
-def compare_frame_features(py_frame_path, go_frame_path):
+def compare_frame_features(py_frame, go_frame_path):
     """Compare a single frame's features."""
-    # Load Python frame
-    py_frame = np.load(py_frame_path)
     
     # Load Go frame
     try:
@@ -156,17 +154,15 @@ def main():
     py_dir = "../audio_pipeline/my_audio_output"
     go_dir = "go_output"
     
+    # Load Go metadata once; both comparisons read its stats
+    with open(f"{go_dir}/metadata.json") as f:
+        go_meta = json.load(f)
+    
     # Compare mel spectrograms
-    compare_mel_spec(
-        f"{py_dir}/mel_spectrogram.npy",
-        f"{go_dir}/metadata.json"
-    )
+    compare_mel_spec(f"{py_dir}/mel_spectrogram.npy", go_meta)
     
     # Compare audio features
-    features_similar = compare_audio_features(
-        f"{py_dir}/audio_features_padded.npy",
-        f"{go_dir}/metadata.json"
-    )
+    features_similar = compare_audio_features(f"{py_dir}/audio_features_padded.npy", go_meta)
     
     # Compare sample frames
     print("\n" + "="*70)
@@ -175,14 +171,16 @@ def main():
     
     frames_to_compare = [0, 748]  # Start and middle
     
+    # All Python frames are stacked in one file; mmap reads just the compared rows
+    py_frames = np.load(f"{py_dir}/frames_reshaped.npy", mmap_mode='r')
+    
     all_match = True
     for frame_idx in frames_to_compare:
         print(f"\n--- Frame {frame_idx} ---")
-        py_frame = f"{py_dir}/frames/frame_{frame_idx:05d}_reshaped.npy"
         go_frame = f"{go_dir}/frames/frame_{frame_idx:05d}.bin"
         
         try:
-            match = compare_frame_features(py_frame, go_frame)
+            match = compare_frame_features(py_frames[frame_idx], go_frame)
             all_match = all_match and match
         except FileNotFoundError as e:
             print(f"⚠ File not found: {e}")
@@ -16,7 +16,10 @@ from audio_pipeline.audio_encoder import AudioEncoder
 def export_audio_encoder_to_onnx(
     checkpoint_path: str,
     output_path: str,
-    opset_version: int = 12
+    opset_version: int = 12,
+    export_fp16: bool = True,
+    export_int8: bool = True,
+    verbose: bool = True
 ):
     """
     Export AudioEncoder model to ONNX format.
@@ -25,6 +28,9 @@ def export_audio_encoder_to_onnx(
         checkpoint_path: Path to PyTorch checkpoint
         output_path: Where to save ONNX model
         opset_version: ONNX opset version (12 is widely supported)
+        export_fp16: Also save an FP16-weight copy as *_fp16.onnx (float32 I/O)
+        export_int8: Also save a dynamically quantized INT8 copy as *_int8.onnx
+        verbose: Print model details such as the parameter count
     """
     print("=" * 70)
     print("Exporting AudioEncoder to ONNX")
@@ -48,7 +54,8 @@ def export_audio_encoder_to_onnx(
     model.eval()
     
     print(f"   ✓ Model loaded successfully")
-    print(f"   ✓ Total parameters: {sum(p.numel() for p in model.parameters()):,}")
+    if verbose:
+        print(f"   ✓ Total parameters: {sum(p.numel() for p in model.parameters()):,}")
     
     # Create example input
     print(f"\n2. Creating example input")
@@ -62,7 +69,7 @@ def export_audio_encoder_to_onnx(
     
     # Test forward pass
     print(f"\n3. Testing forward pass")
-    with torch.no_grad():
+    with torch.inference_mode():
         output = model(example_input)
     print(f"   ✓ Output shape: {output.shape}")
     print(f"   ✓ Output range: [{output.min():.4f}, {output.max():.4f}]")
@@ -72,8 +79,13 @@ def export_audio_encoder_to_onnx(
     print(f"   Output: {output_path}")
     print(f"   Opset version: {opset_version}")
     
+    # Export from a traced graph; the encoder has no data-dependent control
+    # flow, so the trace is exact and generalizes over the batch axis
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example_input)
+    
     torch.onnx.export(
-        model,
+        traced,
         example_input,
         output_path,
         export_params=True,
@@ -119,9 +131,10 @@ def export_audio_encoder_to_onnx(
     
     # Test ONNX Runtime inference
     print(f"\n7. Testing ONNX Runtime inference")
-    import onnxruntime as ort
+    from onnx_server import create_session
     
-    session = ort.InferenceSession(output_path)
+    # Same session setup as the server, without caching the optimized graph
+    session = create_session(output_path, cache_optimized=False)
     
     # Run inference
     ort_inputs = {session.get_inputs()[0].name: example_input.numpy()}
@@ -147,6 +160,53 @@ def export_audio_encoder_to_onnx(
     else:
         print(f"   ⚠ Warning: Larger than expected difference")
     
+    # The window length stays fixed at 16: the encoder only reduces a
+    # (80, 16) window to one 512-d vector, so whole clips are fed as a batch
+    if export_fp16:
+        print(f"\n9. Exporting FP16 weights")
+        try:
+            from onnxconverter_common import float16
+        except ImportError:
+            float16 = None
+            print(f"   ⚠ onnxconverter-common not installed, skipping FP16 export")
+        
+        if float16 is not None:
+            fp16_path = output_path.replace('.onnx', '_fp16.onnx')
+            # keep_io_types: callers keep sending and receiving float32
+            onnx_model_fp16 = float16.convert_float_to_float16(onnx_model, keep_io_types=True)
+            onnx.save(onnx_model_fp16, fp16_path)
+            
+            session_fp16 = create_session(fp16_path, cache_optimized=False)
+            fp16_outputs = session_fp16.run(None, ort_inputs)
+            fp16_diff = torch.abs(output - torch.from_numpy(fp16_outputs[0])).max().item()
+            
+            print(f"   ✓ Saved: {fp16_path}")
+            print(f"   ✓ Size: {os.path.getsize(fp16_path) / 1e6:.1f} MB "
+                  f"(FP32: {os.path.getsize(output_path) / 1e6:.1f} MB)")
+            print(f"   Max difference vs PyTorch: {fp16_diff:.6f}")
+    
+    if export_int8:
+        print(f"\n10. Exporting INT8 (dynamic quantization)")
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        
+        int8_path = output_path.replace('.onnx', '_int8.onnx')
+        quantize_dynamic(
+            output_path,
+            int8_path,
+            weight_type=QuantType.QInt8,
+            op_types_to_quantize=['Conv', 'MatMul', 'Gemm']
+        )
+        
+        session_int8 = create_session(int8_path, cache_optimized=False)
+        int8_outputs = session_int8.run(None, ort_inputs)
+        int8_diff = torch.abs(torch.from_numpy(ort_outputs[0]) - torch.from_numpy(int8_outputs[0]))
+        
+        print(f"   ✓ Saved: {int8_path}")
+        print(f"   ✓ Size: {os.path.getsize(int8_path) / 1e6:.1f} MB "
+              f"(FP32: {os.path.getsize(output_path) / 1e6:.1f} MB)")
+        print(f"   Max difference vs FP32 ONNX: {int8_diff.max().item():.6f}")
+        print(f"   Mean difference vs FP32 ONNX: {int8_diff.mean().item():.6f}")
+    
     print("\n" + "=" * 70)
     print("✅ Export Complete!")
     print("=" * 70)
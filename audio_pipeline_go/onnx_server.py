@@ -4,49 +4,266 @@ Simple ONNX inference server for Go to call.
 This is a temporary bridge until full ONNX Runtime Go integration.
 """
 
+import os
+import select
+import struct
 import sys
 import onnxruntime as ort
 import numpy as np
 import json
 
+# Largest number of queued requests run in a single session call
+MAX_BATCH = 64
+# Per-request input shape (channels, n_mels, n_frames)
+INPUT_SHAPE = (1, 80, 16)
+READ_CHUNK = 1 << 20
+# Binary transport: little-endian uint32 value count, then raw float32 values
+HEADER = struct.Struct('<I')
+ERROR_COUNT = 0xFFFFFFFF
+# Suffix of the graph-optimized model cached next to the source model
+OPTIMIZED_SUFFIX = '.opt.onnx'
+
+
+def create_session(model_path: str, cache_optimized: bool = True):
+    """
+    Create an ONNX Runtime session with full graph optimization.
+    
+    Args:
+        model_path: Path to the ONNX model
+        cache_optimized: Save the optimized graph next to the model and reuse
+            it on later starts while it is newer than the source model
+        
+    Returns:
+        ort.InferenceSession
+    """
+    so = ort.SessionOptions()
+    so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    so.intra_op_num_threads = os.cpu_count() or 1
+    so.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    
+    if cache_optimized:
+        optimized_path = model_path + OPTIMIZED_SUFFIX
+        if (os.path.exists(optimized_path)
+                and os.path.getmtime(optimized_path) >= os.path.getmtime(model_path)):
+            # Already fused and folded; skip re-optimizing at startup
+            model_path = optimized_path
+            so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        else:
+            so.optimized_model_filepath = optimized_path
+    
+    providers = ['CPUExecutionProvider']
+    if sys.platform == 'darwin' and 'CoreMLExecutionProvider' in ort.get_available_providers():
+        providers.insert(0, 'CoreMLExecutionProvider')
+    
+    return ort.InferenceSession(model_path, sess_options=so, providers=providers)
+
+
+def fill_buffer(fd: int, buffer: bytearray, has_request) -> bool:
+    """
+    Block until the buffer holds at least one complete request, then drain
+    whatever else is already waiting on stdin without blocking.
+    
+    Args:
+        fd: File descriptor to read requests from
+        buffer: Bytes read so far, including any incomplete request
+        has_request: Predicate telling whether buffer holds a whole request
+    
+    Returns:
+        False once end of input is reached before a complete request
+    """
+    while not has_request(buffer):
+        chunk = os.read(fd, READ_CHUNK)
+        if not chunk:
+            return False
+        buffer += chunk
+    
+    while select.select([fd], [], [], 0)[0]:
+        chunk = os.read(fd, READ_CHUNK)
+        if not chunk:
+            break
+        buffer += chunk
+    return True
+
+
+def has_json_request(buffer: bytearray) -> bool:
+    """Whether buffer holds a complete newline-terminated JSON request."""
+    return b'\n' in buffer
+
+
+def split_json_requests(buffer: bytearray) -> list:
+    """
+    Pop all complete JSON request lines off the buffer and decode them.
+    
+    Args:
+        buffer: Bytes read so far; the trailing incomplete line is kept
+    
+    Returns:
+        Per request, the (1, 80, 16) input array or an error message
+    """
+    *lines, rest = buffer.split(b'\n')
+    buffer[:] = rest
+    
+    requests = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+            requests.append(np.asarray(data['input'], dtype=np.float32).reshape(INPUT_SHAPE))
+        except Exception as e:
+            requests.append(str(e))
+    return requests
+
+
+def has_binary_request(buffer: bytearray) -> bool:
+    """Whether buffer holds a complete length-prefixed float32 frame."""
+    if len(buffer) < HEADER.size:
+        return False
+    (count,) = HEADER.unpack_from(buffer)
+    return len(buffer) >= HEADER.size + 4 * count
+
+
+def split_binary_requests(buffer: bytearray) -> list:
+    """
+    Pop all complete length-prefixed float32 frames off the buffer.
+    
+    Args:
+        buffer: Bytes read so far; a trailing incomplete frame is kept
+    
+    Returns:
+        Per request, the (1, 80, 16) input array or an error message
+    """
+    data = bytes(buffer)
+    requests = []
+    offset = 0
+    while len(data) - offset >= HEADER.size:
+        (count,) = HEADER.unpack_from(data, offset)
+        end = offset + HEADER.size + 4 * count
+        if len(data) < end:
+            break
+        try:
+            values = np.frombuffer(data, dtype='<f4', count=count, offset=offset + HEADER.size)
+            requests.append(values.reshape(INPUT_SHAPE))
+        except Exception as e:
+            requests.append(str(e))
+        offset = end
+    buffer[:] = data[offset:]
+    return requests
+
+
+def encode_json_response(result) -> bytes:
+    """Encode one result (array or error message) as a JSON line."""
+    if isinstance(result, str):
+        return (json.dumps({'error': result}) + '\n').encode()
+    return (json.dumps({'output': result.tolist()}) + '\n').encode()
+
+
+def encode_binary_response(result) -> bytes:
+    """
+    Encode one result as a length-prefixed float32 frame. Errors are sent as
+    an ERROR_COUNT header, then a length-prefixed UTF-8 message.
+    """
+    if isinstance(result, str):
+        message = result.encode()
+        return HEADER.pack(ERROR_COUNT) + HEADER.pack(len(message)) + message
+    return HEADER.pack(result.size) + result.astype('<f4', copy=False).tobytes()
+
+
+def run_batch(session, binding, input_buffer, input_name, output_name, requests) -> list:
+    """
+    Run one batched inference over a group of decoded requests.
+    
+    Args:
+        session: ONNX Runtime inference session
+        binding: IOBinding reused across batches
+        input_buffer: Preallocated (MAX_BATCH, 1, 80, 16) float32 input buffer
+        input_name: Model input name
+        output_name: Model output name
+        requests: Input arrays or decode error messages (at most MAX_BATCH)
+    
+    Returns:
+        Per request, the flattened output array or an error message
+    """
+    results = list(requests)
+    slots = [i for i, request in enumerate(requests) if not isinstance(request, str)]
+    
+    if slots:
+        try:
+            # Stack straight into the bound buffer; ORT reads it in place
+            batch = input_buffer[:len(slots)]
+            np.stack([requests[i] for i in slots], out=batch)
+            binding.bind_input(
+                name=input_name,
+                device_type='cpu',
+                device_id=0,
+                element_type=np.float32,
+                shape=batch.shape,
+                buffer_ptr=batch.ctypes.data
+            )
+            session.run_with_iobinding(binding)
+            output = binding.copy_outputs_to_cpu()[0]
+    
+            for row, i in enumerate(slots):
+                results[i] = output[row].ravel()
+        except Exception as e:
+            for i in slots:
+                results[i] = str(e)
+    
+    return results
+
+
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: onnx_server.py <model_path>", file=sys.stderr)
+    args = [arg for arg in sys.argv[1:] if arg != '--binary']
+    if len(args) < 1:
+        print("Usage: onnx_server.py <model_path> [--binary]", file=sys.stderr)
         sys.exit(1)
     
-    model_path = sys.argv[1]
+    model_path = args[0]
+    binary = '--binary' in sys.argv[1:]
+    if binary:
+        has_request, split_requests, encode_response = (
+            has_binary_request, split_binary_requests, encode_binary_response
+        )
+    else:
+        has_request, split_requests, encode_response = (
+            has_json_request, split_json_requests, encode_json_response
+        )
     
     # Load model
-    session = ort.InferenceSession(model_path)
+    session = create_session(model_path)
+    input_name = session.get_inputs()[0].name
+    output_name = session.get_outputs()[0].name
+    
+    # Bound once; the input is rebound per batch onto the same buffer
+    binding = session.io_binding()
+    binding.bind_output(output_name, 'cpu')
+    input_buffer = np.empty((MAX_BATCH,) + INPUT_SHAPE, dtype=np.float32)
     
     print(f"ONNX Server Ready: {model_path}", file=sys.stderr)
     print("READY", flush=True)
     
-    # Read requests from stdin
-    for line in sys.stdin:
-        try:
-            data = json.loads(line)
-            
-            # Get input array
-            input_data = np.array(data['input'], dtype=np.float32)
-            
-            # Reshape to (1, 1, 80, 16)
-            input_tensor = input_data.reshape(1, 1, 80, 16)
-            
-            # Run inference
-            output = session.run(None, {session.get_inputs()[0].name: input_tensor})
-            
-            # Return result
-            result = {
-                'output': output[0].flatten().tolist()
-            }
-            
-            print(json.dumps(result), flush=True)
-            
-        except Exception as e:
-            error_result = {'error': str(e)}
-            print(json.dumps(error_result), flush=True)
+    # Read requests from stdin, batching whatever is queued
+    fd = sys.stdin.fileno()
+    out = sys.stdout.buffer
+    pending = bytearray()
+    while True:
+        more = fill_buffer(fd, pending, has_request)
+        if not more and not binary and pending.strip():
+            # Final JSON request without a trailing newline
+            pending += b'\n'
+        requests = split_requests(pending)
+        if not requests:
+            break
+    
+        for start in range(0, len(requests), MAX_BATCH):
+            results = run_batch(
+                session, binding, input_buffer, input_name, output_name,
+                requests[start:start + MAX_BATCH]
+            )
+            out.write(b''.join(encode_response(result) for result in results))
+        out.flush()
+        if not more:
+            break
 
 if __name__ == "__main__":
     main()
-
@@ -12,7 +12,7 @@ Classes:
     AppConfig: Root configuration container that combines all config sections
 
 Usage:
-    from config import settings
+    from config import settings  # or: from config import get_settings
     
     # Access configuration values
     device = settings.models.device
@@ -21,6 +21,7 @@ Usage:
 """
 
 from pydantic import BaseModel, ConfigDict, Field
+import functools
 import torch
 from typing import Optional
 
@@ -35,6 +36,7 @@ class ModelConfig(BaseModel):
         template_img_path: Path to the template image for animation
         template_lms_path: Path to the landmarks file for the template image
     """
+    model_config = ConfigDict(frozen=True)
     device: str = 'cuda' if torch.cuda.is_available() else 'cpu'
     checkpoint_path: str = "./checkpoint/Awais/5.pth" 
     audio_encoder_ckpt: str = 'model/checkpoints/audio_visual_encoder.pth'
@@ -51,13 +53,15 @@ class TTSConfig(BaseModel):
         sample_rate: Audio sample rate for TTS output
         espeak_data_dir: Directory containing eSpeak data files for phoneme processing
         espeak_data_path: Alias for espeak_data_dir (kept for backward compatibility)
+        cache_max_bytes: Byte budget for the in-memory synthesis cache (0 disables it)
     """
-    model_config = ConfigDict(protected_namespaces=())
+    model_config = ConfigDict(frozen=True, protected_namespaces=())
     model_path: str = "./models/en_US-lessac-low.onnx"
     model_config_path: str = "./models/en_US-lessac-low.onnx.json"
     sample_rate: int = 16000
     espeak_data_dir: str = "./local_espeak_data" 
     espeak_data_path: str = "./local_espeak_data"  # Kept for backward compatibility
+    cache_max_bytes: int = 100 * 1024 * 1024  # 100MB of cached PCM audio
 
 class DebugConfig(BaseModel):
     """
@@ -87,9 +91,23 @@ class AppConfig(BaseModel):
         tts: Configuration for Text-to-Speech services
         debug: Configuration for debugging and diagnostics
     """
+    model_config = ConfigDict(frozen=True)
     models: ModelConfig = Field(default_factory=ModelConfig)
     tts: TTSConfig = Field(default_factory=TTSConfig)
     debug: DebugConfig = Field(default_factory=DebugConfig)
 
-# Create a single, immutable config instance
-settings = AppConfig()
+@functools.lru_cache(maxsize=None)
+def get_settings() -> AppConfig:
+    """
+    Return the application config, building and validating it on first use.
+    
+    Returns:
+        AppConfig: The single shared config instance
+    """
+    return AppConfig()
+
+def __getattr__(name):
+    # `settings` is created lazily, so importing this module alone costs no validation
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,4 +1,6 @@
 import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
 from os import wait3
 
 import numpy as np
@@ -6,7 +8,6 @@ import cv2
 import math
 
 import torch
-import torchvision
 from detect_face import SCRFD
 from pfld_mobileone import PFLD_GhostOne as PFLDInference
 def face_det(img, model):
@@ -73,41 +74,50 @@ class Landmark:
         self.mean_face = np.asarray(mean_face.split(' '), dtype=np.float32)
         self.det_net = SCRFD('./data_utils/scrfd_2.5g_kps.onnx', confThreshold=0.1, nmsThreshold=0.5)
 
-        checkpoint = torch.load('./data_utils/checkpoint_epoch_335.pth.tar')
-        self.pfld_backbone = PFLDInference().cuda()
-        self.pfld_backbone.load_state_dict(checkpoint['pfld_backbone'])
-        self.pfld_backbone.eval()
+        # Build on the meta device and adopt the mmap-backed weights, so the
+        # backbone is never randomly initialized only to be overwritten
+        checkpoint = torch.load('./data_utils/checkpoint_epoch_335.pth.tar', map_location='cpu', mmap=True)
+        with torch.device('meta'):
+            self.pfld_backbone = PFLDInference()
+        self.pfld_backbone.load_state_dict(checkpoint['pfld_backbone'], assign=True)
+        self.pfld_backbone = self.pfld_backbone.cuda().eval()
 
-    def detect(self, img_path):
-        
-        img = cv2.imread(img_path)
-        img_ori = img.copy()
-
-        h,w = img_ori.shape[:2]
+    def _prepare(self, img):
+        # Face crop resized to the PFLD input, plus what's needed to map back
         cropped_imgs, boxes_list, center_list, alpha_list = face_det(img, self.det_net)
         cropped = cropped_imgs[0]
-        # cv2.imshow("cropped", cropped)
         h,w = cropped.shape[:2]
         x1, y1, x2, y2 = boxes_list[0]
-        transform = torchvision.transforms.Compose(
-                [torchvision.transforms.ToTensor()])
         input = cv2.resize(cropped, (192, 192))
-        input = np.asarray(input, dtype=np.float32) / 255.0
-        input = input.transpose(2,0,1)
-        input = torch.from_numpy(input)[None]
-        input = input.cuda()
-        # print(input)
-        # asd
+        return input, w, h, x1, y1
 
-        # input = transform(input).unsqueeze(0).cuda()
-        landmarks = self.pfld_backbone(input)
-        pre_landmark = landmarks[0]
-        pre_landmark = pre_landmark.cpu().detach().numpy()
-        pre_landmark = pre_landmark + self.mean_face
+    def _finish(self, landmarks, w, h):
+        pre_landmark = landmarks + self.mean_face
 
         pre_landmark = pre_landmark.reshape(-1, 2)
         pre_landmark[:,0] *= w
         pre_landmark[:,1] *= h
         pre_landmark = pre_landmark.astype(np.int32)
-        return pre_landmark, x1, y1
-        
\ No newline at end of file
+        return pre_landmark
+
+    def detect(self, img_path):
+        return self.detect_batch([img_path])[0]
+
+    def detect_batch(self, img_paths, batch_size=32):
+        # JPEG decode (GIL released) runs on a thread pool; face detection stays
+        # per image, and PFLD runs once per batch of crops
+        results = []
+        with ThreadPoolExecutor(max_workers=min(batch_size, os.cpu_count() or 1)) as pool:
+            for start in range(0, len(img_paths), batch_size):
+                imgs = pool.map(cv2.imread, img_paths[start:start + batch_size])
+                prepared = [self._prepare(img) for img in imgs]
+
+                # Upload uint8 crops and scale to [0, 1] on the GPU
+                crops = np.stack([p[0] for p in prepared])
+                input = torch.from_numpy(crops).cuda().permute(0, 3, 1, 2).float().div_(255.0).contiguous()
+                with torch.inference_mode():
+                    landmarks = self.pfld_backbone(input).cpu().numpy()
+
+                for row, (_, w, h, x1, y1) in zip(landmarks, prepared):
+                    results.append((self._finish(row, w, h), x1, y1))
+        return results
@@ -1,13 +1,37 @@
+import functools
+import json
 import os
-import cv2
+import subprocess
+import sys
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
 import numpy as np
 from tqdm import tqdm
+
+# Frames per PFLD forward pass in get_landmark
+LANDMARK_BATCH = 32
+
+# Extension filters, matched against name.rpartition('.')[2]
+JPG_EXTS = frozenset({'jpg'})
+LMS_EXTS = frozenset({'lms'})
+
+# scandir gets the file type from readdir, so counting needs no stat() per entry
+def _count_with_ext(path, exts=None):
+    with os.scandir(path) as it:
+        return sum(1 for e in it if (exts is None or e.name.rpartition('.')[2] in exts) and e.is_file())
+
+# One detector per process; loading SCRFD and PFLD dominates short runs
+@functools.lru_cache(maxsize=1)
+def _get_landmark_detector():
+    from get_landmark import Landmark
+    return Landmark()
+
 def extract_audio(path, out_path, sample_rate=16000):
     
     print(f'[INFO] ===== extract audio from {path} to {out_path} =====')
-    cmd = f'ffmpeg -i {path} -f wav -ar {sample_rate} {out_path}'
-    os.system(cmd)
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', path, '-f', 'wav', '-ar', str(sample_rate), out_path]
+    subprocess.run(cmd, check=True)
     print(f'[INFO] ===== extracted audio =====')
     
 def extract_images(path):
@@ -16,34 +40,34 @@ def extract_images(path):
     full_body_dir = path.replace(path.split("/")[-1], "full_body_img")
     os.makedirs(full_body_dir, exist_ok=True)
 
-    total_frames = get_video_frame_count(path)
-    existing_frames = len([name for name in os.listdir(full_body_dir) if os.path.isfile(os.path.join(full_body_dir, name))])
+    fps, total_frames = probe_video(path)
+    # Frames are written in order as {counter}.jpg, so the last one existing means all do
+    if total_frames > 0 and os.path.exists(os.path.join(full_body_dir, f"{total_frames-1}.jpg")):
+        print(f"Images in '{full_body_dir}' seem to be completely extracted already ({total_frames}/{total_frames} frames). Skipping image extraction.")
+        return
+    existing_frames = _count_with_ext(full_body_dir)
 
     if total_frames > 0 and existing_frames >= total_frames:
         print(f"Images in '{full_body_dir}' seem to be completely extracted already ({existing_frames}/{total_frames} frames). Skipping image extraction.")
         return
     
-    cap = cv2.VideoCapture(path)
-    fps = cap.get(cv2.CAP_PROP_FPS)
     if fps != 25:
         # High quality conversion to 25fps using ffmpeg
-        cmd = f'ffmpeg -i {path} -vf "fps=25" -c:v libx264 -c:a aac {path.replace(".mp4", "_25fps.mp4")}'
-        os.system(cmd)
+        cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', path, '-vf', 'fps=25',
+               '-c:v', 'libx264', '-c:a', 'aac', path.replace(".mp4", "_25fps.mp4")]
+        subprocess.run(cmd, check=True)
         path = path.replace(".mp4", "_25fps.mp4")
-    
-    cap = cv2.VideoCapture(path)
-    fps = cap.get(cv2.CAP_PROP_FPS)
+        # The fps filter guarantees the rate; probe again only to confirm it
+        fps, _ = probe_video(path)
     if fps != 25:
         raise ValueError("Your video fps should be 25!!!")
         
     print("extracting images...")
-    counter = 0
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        cv2.imwrite(full_body_dir+"/"+str(counter)+'.jpg', frame)
-        counter += 1
+    # One ffmpeg pass writes 0.jpg, 1.jpg, ... (one file per decoded frame, no
+    # fps resampling); -y overwrites frames left by an interrupted run
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', path, '-vsync', '0', '-qscale:v', '2',
+           '-start_number', '0', os.path.join(full_body_dir, '%d.jpg')]
+    subprocess.run(cmd, check=True)
         
 def get_audio_feature(wav_path):
     
@@ -54,49 +78,67 @@ def get_audio_feature(wav_path):
         print(f"Audio feature file '{audio_feature_path}' already exists. Skipping audio feature extraction.")
         return
 
-    os.system("python ./data_utils/ave/test_w2l_audio.py --wav_path "+wav_path)
+    subprocess.run([sys.executable, './data_utils/ave/test_w2l_audio.py', '--wav_path', wav_path], check=True)
     
 def get_landmark(path, landmarks_dir):
     print("detecting landmarks...")
     full_img_dir = path.replace(path.split("/")[-1], "full_body_img")
 
-    if not os.path.exists(full_img_dir) or len(os.listdir(full_img_dir)) == 0:
+    if not os.path.exists(full_img_dir):
         print(f"Image directory '{full_img_dir}' is empty. Cannot process landmarks.")
         return
 
-    num_images = len([name for name in os.listdir(full_img_dir) if name.endswith('.jpg')])
+    # The only read of the image directory: the entries are reused for counting and detection
+    with os.scandir(full_img_dir) as it:
+        img_entries = [e for e in it if e.name.rpartition('.')[2] in JPG_EXTS]
+    num_images = len(img_entries)
+    if num_images == 0:
+        print(f"Image directory '{full_img_dir}' is empty. Cannot process landmarks.")
+        return
     
     os.makedirs(landmarks_dir, exist_ok=True)
-    num_landmarks = len([name for name in os.listdir(landmarks_dir) if name.endswith('.lms')])
+    # Landmarks are written in frame order, so the last one existing means all do
+    if os.path.exists(os.path.join(landmarks_dir, f"{num_images-1}.lms")):
+        print(f"Landmarks in '{landmarks_dir}' seem to be completely generated already ({num_images}/{num_images} files). Skipping landmark detection.")
+        return
+    num_landmarks = _count_with_ext(landmarks_dir, LMS_EXTS)
 
-    if num_images > 0 and num_landmarks >= num_images:
+    if num_landmarks >= num_images:
         print(f"Landmarks in '{landmarks_dir}' seem to be completely generated already ({num_landmarks}/{num_images} files). Skipping landmark detection.")
         return
     
-    from get_landmark import Landmark
-    landmark = Landmark()
+    landmark = _get_landmark_detector()
     
-    for img_name in tqdm(os.listdir(full_img_dir)):
-        if not img_name.endswith(".jpg"):
-            continue
-        img_path = os.path.join(full_img_dir, img_name)
-        lms_path = os.path.join(landmarks_dir, img_name.replace(".jpg", ".lms"))
-        pre_landmark, x1, y1 = landmark.detect(img_path)
-        with open(lms_path, "w") as f:
-            for p in pre_landmark:
-                x, y = p[0]+x1, p[1]+y1
-                f.write(str(x))
-                f.write(" ")
-                f.write(str(y))
-                f.write("\n")
-
-def get_video_frame_count(video_path):
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        return 0
-    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    cap.release()
-    return frame_count
+    # Frame order (0.jpg, 1.jpg, ...) keeps the last-landmark probe above valid
+    img_entries.sort(key=lambda e: (0, int(e.name[:-4])) if e.name[:-4].isdigit() else (1, e.name))
+    
+    with tqdm(total=len(img_entries)) as pbar:
+        for start in range(0, len(img_entries), LANDMARK_BATCH):
+            batch = img_entries[start:start + LANDMARK_BATCH]
+            detections = landmark.detect_batch([e.path for e in batch], batch_size=LANDMARK_BATCH)
+            for entry, (pre_landmark, x1, y1) in zip(batch, detections):
+                lms_path = os.path.join(landmarks_dir, entry.name.replace(".jpg", ".lms"))
+                # Integer "x y" lines, formatted in one C-level call
+                np.savetxt(lms_path, pre_landmark + np.array([x1, y1]), fmt='%d', delimiter=' ')
+            pbar.update(len(batch))
+
+# One ffprobe call reads both values from the container headers, without
+# initializing a decoder the way cv2.VideoCapture does
+def probe_video(video_path):
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+           '-show_entries', 'stream=r_frame_rate,nb_frames', '-of', 'json', video_path]
+    try:
+        streams = json.loads(subprocess.check_output(cmd)).get('streams') or [{}]
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return 0, 0
+    stream = streams[0]
+    try:
+        fps = float(Fraction(stream.get('r_frame_rate', '0')))
+    except (ValueError, ZeroDivisionError):
+        fps = 0
+    nb_frames = stream.get('nb_frames', '')
+    frame_count = int(nb_frames) if nb_frames.isdigit() else 0
+    return fps, frame_count
 
 if __name__ == "__main__":
     
@@ -110,8 +152,16 @@ if __name__ == "__main__":
 
     os.makedirs(landmarks_dir, exist_ok=True)
     
-    extract_audio(opt.path, wav_path)
-    extract_images(opt.path)
-    get_landmark(opt.path, landmarks_dir)
-    get_audio_feature(wav_path)
+    # The audio chain (extract -> AVE features) and the image chain (frames ->
+    # landmarks) are independent; both are mostly ffmpeg/subprocess/GPU work,
+    # so a thread overlaps them without pickling or CUDA-in-fork issues
+    def audio_stages():
+        extract_audio(opt.path, wav_path)
+        get_audio_feature(wav_path)
+    
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        audio_future = pool.submit(audio_stages)
+        extract_images(opt.path)
+        get_landmark(opt.path, landmarks_dir)
+        audio_future.result()
 
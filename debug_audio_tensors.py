@@ -10,7 +10,8 @@ def load_swift_audio_features():
     """Load audio features from Swift's processing"""
     # Swift should be saving these to the audio encoder output
     # For now, let's check what Go is using
-    go_audio = np.load('model/sanders_full_onnx/aud_ave.npy')
+    # Memory-mapped: pages are read through the page cache as stats touch them
+    go_audio = np.load('model/sanders_full_onnx/aud_ave.npy', mmap_mode='r')
     print(f"Go/Python audio features:")
     print(f"  Shape: {go_audio.shape}")
     print(f"  Range: [{go_audio.min():.3f}, {go_audio.max():.3f}]")
@@ -28,7 +29,7 @@ def load_swift_audio_features():
 
 def check_reshaping():
     """Check how audio is reshaped to (32, 16, 16)"""
-    features = np.load('model/sanders_full_onnx/aud_ave.npy')
+    features = np.load('model/sanders_full_onnx/aud_ave.npy', mmap_mode='r')
     
     print("Checking reshape from (512) to (32, 16, 16):")
     print()
@@ -39,14 +40,14 @@ def check_reshaping():
     print(f"  First 10: {frame_feat[:10]}")
     print()
     
-    # Reshape by tiling
-    target_size = 32 * 16 * 16  # 8192
-    tiled = np.tile(frame_feat, (target_size // 512) + 1)[:target_size]
-    reshaped = tiled.reshape(1, 32, 16, 16)
+    # Reshape by tiling: 8192 = 16 x 512, so broadcast the frame across the
+    # 16 rows of a (16, 512) view of the output (no tile/slice temporaries)
+    reshaped = np.empty((1, 32, 16, 16), dtype=frame_feat.dtype)
+    reshaped.reshape(16, 512)[:] = frame_feat
     
     print(f"After tiling and reshape: {reshaped.shape}")
     print(f"  Range: [{reshaped.min():.3f}, {reshaped.max():.3f}]")
-    print(f"  First 10 of flattened: {reshaped.flatten()[:10]}")
+    print(f"  First 10 of flattened: {reshaped.reshape(-1)[:10]}")
     print()
     
     # Check if all non-zero
@@ -78,6 +79,7 @@ def main():
     print("2. Is reshaping correct?")
     print("   - Should tile 512 → 8192 values")
     print("   - Then reshape to (1, 32, 16, 16)")
+    print("   - i.e. copy the same 512 floats into each of the 16 consecutive 512-float blocks")
     print("   - Values should match the tiled pattern")
     print()
     print("3. Is the audio tensor being passed to Core ML?")
@@ -6,6 +6,8 @@ Bypasses ONNX completely!
 
 import torch
 import coremltools as ct
+from torch.nn.modules.utils import consume_prefix_in_state_dict_if_present
+import contextlib
 import sys
 import os
 
@@ -19,6 +21,29 @@ print(f"coremltools version: {ct.__version__}")
 print(f"PyTorch version: {torch.__version__}")
 print()
 
+# mmap checkpoint loading and load_state_dict(assign=True) need torch >= 2.1
+MMAP_LOAD = tuple(int(v) for v in torch.__version__.split('+')[0].split('.')[:2]) >= (2, 1)
+LOAD_KWARGS = {'assign': True} if MMAP_LOAD else {}
+
+def init_device(weights_follow=True):
+    """
+    Device context for building a model. When real weights will be assigned
+    afterwards, parameters are created on the meta device (no allocation or
+    random init); the assign=True load then adopts the checkpoint tensors.
+    """
+    if MMAP_LOAD and weights_follow:
+        return torch.device('meta')
+    return contextlib.nullcontext()
+
+def load_checkpoint(checkpoint_path):
+    """Load a checkpoint, memory-mapped so weights are paged in lazily when supported"""
+    if MMAP_LOAD:
+        try:
+            return torch.load(checkpoint_path, map_location='cpu', mmap=True)
+        except RuntimeError:
+            pass  # Legacy (non-zipfile) checkpoints can't be memory-mapped
+    return torch.load(checkpoint_path, map_location='cpu')
+
 def convert_audio_encoder_pytorch():
     """
     Convert audio encoder from PyTorch to Core ML
@@ -38,20 +63,19 @@ def convert_audio_encoder_pytorch():
     
     # Load PyTorch model
     print("Loading PyTorch model...")
-    model = AudioEncoder().eval()
+    with init_device():
+        model = AudioEncoder()
     
     # Load weights
-    ckpt = torch.load(checkpoint_path, map_location='cpu')
-    # The checkpoint has keys like 'audio_encoder.audio_encoder.0.conv_block.0.weight'
-    # We need to extract just the audio_encoder part
-    audio_encoder_state = {}
-    for k, v in ckpt.items():
-        if k.startswith('audio_encoder.'):
-            # Remove the 'audio_encoder.' prefix
-            new_key = k.replace('audio_encoder.', '')
-            audio_encoder_state[new_key] = v
-    
-    model.load_state_dict(audio_encoder_state, strict=False)
+    ckpt = load_checkpoint(checkpoint_path)
+    # Checkpoints store keys with a doubled prefix ('audio_encoder.audio_encoder.0...'),
+    # a single one, or none ('0.conv_block...'). Stripping up to two prefixes in place
+    # leaves keys relative to the inner Sequential, with no second dict built
+    consume_prefix_in_state_dict_if_present(ckpt, 'audio_encoder.')
+    consume_prefix_in_state_dict_if_present(ckpt, 'audio_encoder.')
+    
+    # Strict: a meta-initialized model must receive every weight
+    model.audio_encoder.load_state_dict(ckpt, **LOAD_KWARGS)
     model.eval()
     print("✓ PyTorch model loaded")
     
@@ -59,13 +83,16 @@ def convert_audio_encoder_pytorch():
     example_input = torch.randn(1, 1, 80, 16)
     
     # Test the model
-    with torch.no_grad():
+    with torch.inference_mode():
         test_output = model(example_input)
     print(f"  Test output shape: {test_output.shape}")
     
-    # Trace the model
+    # Trace the model. no_grad rather than inference_mode: a trace recorded in
+    # inference mode can bake inference tensors into the graph, which
+    # coremltools then runs outside it
     print("Tracing model...")
-    traced_model = torch.jit.trace(model, example_input)
+    with torch.no_grad():
+        traced_model = torch.jit.trace(model, example_input)
     
     # Convert to Core ML
     print("Converting to Core ML...")
@@ -73,7 +100,8 @@ def convert_audio_encoder_pytorch():
         traced_model,
         inputs=[ct.TensorType(name='mel', shape=(1, 1, 80, 16))],
         minimum_deployment_target=ct.target.macOS13,
-        compute_units=ct.ComputeUnit.ALL
+        compute_units=ct.ComputeUnit.ALL,
+        compute_precision=ct.precision.FLOAT16  # Native ANE precision, half the weight bytes
     )
     
     # Save
@@ -121,21 +149,23 @@ def convert_generator_pytorch():
     
     # Load PyTorch model
     print("Loading PyTorch model...")
-    model = Model(n_channels=6, mode='ave').eval()
+    has_checkpoint = os.path.exists(checkpoint_path)
+    with init_device(weights_follow=has_checkpoint):
+        model = Model(n_channels=6, mode='ave')
     
     # Load weights
-    if os.path.exists(checkpoint_path):
-        checkpoint = torch.load(checkpoint_path, map_location='cpu')
+    if has_checkpoint:
+        checkpoint = load_checkpoint(checkpoint_path)
         # Handle different checkpoint formats
         if isinstance(checkpoint, dict):
             if 'state_dict' in checkpoint:
-                model.load_state_dict(checkpoint['state_dict'])
+                model.load_state_dict(checkpoint['state_dict'], **LOAD_KWARGS)
             elif 'model_state_dict' in checkpoint:
-                model.load_state_dict(checkpoint['model_state_dict'])
+                model.load_state_dict(checkpoint['model_state_dict'], **LOAD_KWARGS)
             else:
-                model.load_state_dict(checkpoint)
+                model.load_state_dict(checkpoint, **LOAD_KWARGS)
         else:
-            model.load_state_dict(checkpoint)
+            model.load_state_dict(checkpoint, **LOAD_KWARGS)
         print("✓ PyTorch model loaded")
     else:
         print(f"Warning: Checkpoint not found: {checkpoint_path}")
@@ -148,29 +178,51 @@ def convert_generator_pytorch():
     example_audio = torch.randn(1, 32, 16, 16)
     
     # Test the model
-    with torch.no_grad():
+    with torch.inference_mode():
         test_output = model(example_image, example_audio)
     print(f"  Test output shape: {test_output.shape}")
     
-    # Trace the model
+    # Trace the model (under no_grad, as for the audio encoder)
     print("Tracing model...")
-    traced_model = torch.jit.trace(model, (example_image, example_audio))
+    with torch.no_grad():
+        traced_model = torch.jit.trace(model, (example_image, example_audio))
     
     # Convert to Core ML
     print("Converting to Core ML...")
     mlmodel = ct.convert(
         traced_model,
+        # Fully static shapes (no RangeDim) so the Neural Engine compiles one fixed program
         inputs=[
-            ct.TensorType(name='input', shape=(1, 6, 320, 320)),
-            ct.TensorType(name='audio', shape=(1, 32, 16, 16))
+            ct.TensorType(name='input', shape=ct.Shape(shape=(1, 6, 320, 320))),
+            ct.TensorType(name='audio', shape=ct.Shape(shape=(1, 32, 16, 16)))
         ],
+        convert_to='mlprogram',
         minimum_deployment_target=ct.target.macOS13,
-        compute_units=ct.ComputeUnit.ALL
+        compute_units=ct.ComputeUnit.CPU_AND_NE,
+        compute_precision=ct.precision.FLOAT16  # Native ANE precision, half the weight bytes
+    )
+    
+    # The generator holds most of the weights; 6-bit k-means palettes shrink them further
+    print("Palettizing weights (6-bit k-means)...")
+    mlmodel = ct.optimize.coreml.palettize_weights(
+        mlmodel,
+        config=ct.optimize.coreml.OptimizationConfig(
+            global_config=ct.optimize.coreml.OpPalettizerConfig(mode='kmeans', nbits=6)
+        )
     )
     
     # Save
     mlmodel.save(output_path)
     print(f"✓ Saved to {output_path}")
+    
+    # Warm-up predict on the saved package (Core ML predictions only run on
+    # macOS): the ANE compiles and caches the program, so later loads skip it
+    if sys.platform == 'darwin':
+        saved = ct.models.MLModel(output_path, compute_units=ct.ComputeUnit.CPU_AND_NE)
+        prediction = saved.predict({'input': example_image.numpy(), 'audio': example_audio.numpy()})
+        coreml_output = next(iter(prediction.values()))
+        max_diff = (torch.from_numpy(coreml_output) - test_output).abs().max().item()
+        print(f"  Max diff vs PyTorch: {max_diff:.6f}")
     print()
     
     return mlmodel
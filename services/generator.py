@@ -5,8 +5,11 @@ import asyncio
 import time
 import io
 import logging
+import mmap
 import os
 import datetime
+import hashlib
+import tempfile
 from typing import Tuple, Generator, Optional, Any, AsyncGenerator, Dict, Union, List, Callable
 from services.models import ModelService
 from services.tts import TTSService
@@ -24,6 +27,7 @@ class FrameGenerationService:
         models: The model service providing neural networks and the template image
         tts: The text-to-speech service for synthesizing speech
         _cached_preprocess: Cached preprocessed image data to avoid redundant computation
+        _cached_static_jpeg: Cached JPEG encoding of the template image
     """
     
     def __init__(self, model_service: ModelService, tts_service: TTSService) -> None:
@@ -38,6 +42,8 @@ class FrameGenerationService:
         self.tts = tts_service
         # Cache the preprocessed image data
         self._cached_preprocess: Optional[Tuple[torch.Tensor, Tuple[int, int], np.ndarray]] = None
+        # Cache the JPEG-encoded template image
+        self._cached_static_jpeg: Optional[Union[bytes, memoryview]] = None
         
         # Create debug directories if needed
         if settings.debug.enabled:
@@ -141,6 +147,75 @@ class FrameGenerationService:
         self._cached_preprocess = (model_input, (h, w), crop_img_r)
         return self._cached_preprocess
 
+    def _encode_high_quality_jpeg(self, img):
+        """
+        Encode an image as a high-quality JPEG.
+        
+        Args:
+            img: The image to encode
+            
+        Returns:
+            bytes: The JPEG-encoded image
+        """
+        # Use high-quality JPEG encoding
+        encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), 95]
+        _, jpeg = cv2.imencode('.jpg', img, encode_params)
+        return jpeg
+
+    def get_static_jpeg(self) -> Union[bytes, memoryview]:
+        """
+        Get the template image encoded as a high-quality JPEG.
+        
+        The template never changes while the service is running, so it is
+        encoded once and the bytes are reused for every request.
+        
+        Returns:
+            Union[bytes, memoryview]: The JPEG-encoded template image
+        """
+        if self._cached_static_jpeg is None:
+            self._cached_static_jpeg = self._encode_high_quality_jpeg(self.models.img).tobytes()
+        return self._cached_static_jpeg
+
+    def share_static_jpeg(self, path: Optional[str] = None) -> Union[bytes, memoryview]:
+        """
+        Back the static JPEG with a read-only memory map of a file on disk.
+        
+        Each server worker would otherwise hold its own encoded copy; workers
+        mapping the same file share one copy in the OS page cache. The file is
+        (re)written when missing or older than the template image.
+        
+        Args:
+            path: JPEG file to map. Defaults to a file in a 'synctalk_avatar'
+                directory under the system temp dir, named by a hash of the
+                template path. It is never placed next to the template, whose
+                directory holds the dataset frames.
+        
+        Returns:
+            Union[bytes, memoryview]: The mapped JPEG, or the in-memory encoding
+            if the file can't be written
+        """
+        template_path = settings.models.template_img_path
+        if path is None:
+            key = hashlib.sha1(os.path.abspath(template_path).encode()).hexdigest()[:16]
+            path = os.path.join(tempfile.gettempdir(), "synctalk_avatar", f"{key}.jpg")
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(template_path):
+                # Write under a per-process name and rename, so a worker never maps a partial file
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(self.get_static_jpeg())
+                os.replace(tmp_path, path)
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError as e:
+            logging.warning(f"Could not share the static JPEG through {path}: {e}")
+            return self.get_static_jpeg()
+        
+        self._cached_static_jpeg = memoryview(mapped)
+        logging.info(f"Static JPEG mapped from {path}")
+        return self._cached_static_jpeg
+
     async def generate_static_frame(self) -> bytes:
         """
         Generate a static frame (no animation) to show when the app starts.
@@ -151,15 +226,8 @@ class FrameGenerationService:
         Returns:
             bytes: JPEG-encoded frame with HTTP multipart content headers
         """
-        # Get the template image at its original dimensions
-        img = self.models.img.copy()
-            
-        # Encode as high-quality JPEG
-        jpeg = self._encode_high_quality_jpeg(img)
-        frame_bytes = jpeg.tobytes()
-        
         # Format for multipart HTTP response
-        return b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n'
+        return b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + self.get_static_jpeg() + b'\r\n'
 
     async def generate_frames(self, text: str, audio_duration: float = 0.0) -> AsyncGenerator[bytes, None]:
         """
@@ -187,8 +255,8 @@ class FrameGenerationService:
         yield await self.generate_static_frame()
         
         try:
-            # Synthesize speech
-            waveform_bytes = self.tts.synthesize(text)
+            # Synthesize speech in a worker thread so other streams keep running
+            waveform_bytes = await asyncio.to_thread(self.tts.synthesize, text)
             if not waveform_bytes:  # Handle empty result
                 logging.error("TTS synthesis returned empty result")
                 return
@@ -357,7 +425,7 @@ class FrameGenerationService:
         the provided audio.
         
         Args:
-            audio_data: Raw audio bytes from the uploaded file (expected to be 16-bit PCM WAV at 16kHz)
+            audio_data: Raw 16-bit mono PCM samples at 16kHz from the uploaded file (WAV header stripped)
             audio_duration: Optional known audio duration in seconds for better sync
             
         Yields:
@@ -669,8 +737,8 @@ class EnhancedFrameGenerationService(FrameGenerationService):
         yield await self.generate_static_frame()
         
         try:
-            # Synthesize speech
-            waveform_bytes = self.tts.synthesize(text)
+            # Synthesize speech in a worker thread so other streams keep running
+            waveform_bytes = await asyncio.to_thread(self.tts.synthesize, text)
             if not waveform_bytes:  # Handle empty result
                 logging.error("TTS synthesis returned empty result")
                 return
@@ -868,7 +936,7 @@ class EnhancedFrameGenerationService(FrameGenerationService):
         source frames to create realistic head motion, similar to the inference script.
         
         Args:
-            audio_data: Raw audio bytes from the uploaded file
+            audio_data: Raw 16-bit mono PCM samples from the uploaded file (WAV header stripped)
             audio_duration: Optional known audio duration in seconds for better sync
             
         Yields:
@@ -1172,18 +1240,3 @@ class EnhancedFrameGenerationService(FrameGenerationService):
         
         logging.info(f"Adjusting frame rate to {adjusted_fps:.2f} fps to match audio duration of {audio_duration:.2f} seconds")
         return adjusted_fps
-
-    def _encode_high_quality_jpeg(self, img):
-        """
-        Encode an image as a high-quality JPEG.
-        
-        Args:
-            img: The image to encode
-            
-        Returns:
-            bytes: The JPEG-encoded image
-        """
-        # Use high-quality JPEG encoding
-        encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), 95]
-        _, jpeg = cv2.imencode('.jpg', img, encode_params)
-        return jpeg
@@ -63,7 +63,11 @@ class ModelService:
         # Load Generator
         try:
             self.net = Model(6, mode="ave").to(self.device)
-            self.net.load_state_dict(torch.load(config.checkpoint_path, map_location=self.device))
+            # assign=True keeps the mmap-backed tensors on CPU, so workers share the checkpoint pages
+            self.net.load_state_dict(
+                torch.load(config.checkpoint_path, map_location=self.device, mmap=True, weights_only=True),
+                assign=True
+            )
             self.net.eval()
             logging.info(f"Successfully loaded generator model from {config.checkpoint_path}")
         except Exception as e:
@@ -73,8 +77,8 @@ class ModelService:
         # Load Audio Encoder
         try:
             self.audio_encoder = AudioEncoder().to(self.device).eval()
-            ckpt = torch.load(config.audio_encoder_ckpt, map_location=self.device)
-            self.audio_encoder.load_state_dict({f'audio_encoder.{k}': v for k, v in ckpt.items()})
+            ckpt = torch.load(config.audio_encoder_ckpt, map_location=self.device, mmap=True, weights_only=True)
+            self.audio_encoder.load_state_dict({f'audio_encoder.{k}': v for k, v in ckpt.items()}, assign=True)
             logging.info(f"Successfully loaded audio encoder from {config.audio_encoder_ckpt}")
         except Exception as e:
             logging.error(f"Failed to load audio encoder: {str(e)}", exc_info=True)
@@ -9,13 +9,18 @@ The module supports multiple TTS service implementations through the TTSService
 abstract base class, with the primary implementation being PiperTTSService.
 """
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+import functools
 import os
 import json
+import hashlib
 import pathlib
+import struct
+import threading
 import numpy as np
 import logging
 from typing import Optional, Dict, Any, Iterator, List
-from config import settings
+from config import get_settings
 
 # Configure logging
 logging.basicConfig(
@@ -66,6 +71,26 @@ class TTSService(ABC):
             float: Duration in seconds
         """
         pass
+
+    def is_ready(self) -> bool:
+        """Return True if the service can synthesize speech right now."""
+        return True
+
+    def synthesize_stream(self, text: str) -> Iterator[bytes]:
+        """
+        Convert text to audio, yielding PCM chunks as they become available.
+        
+        The default implementation yields the whole synthesis result at once.
+        
+        Args:
+            text: The input text to synthesize
+            
+        Yields:
+            bytes: Raw waveform bytes (16-bit PCM)
+        """
+        audio_bytes = self.synthesize(text)
+        if audio_bytes:
+            yield audio_bytes
     
 class PiperTTSService(TTSService):
     """
@@ -83,16 +108,19 @@ class PiperTTSService(TTSService):
     The service initializes with settings from config.py but can be customized
     by passing a different configuration object to the constructor.
     """
-    def __init__(self, config=settings.tts):
+    def __init__(self, config=None):
         """
         Initialize the Piper TTS service.
         
         Args:
             config: Configuration object with model_path and model_config_path
+                (default: settings.tts)
         """
         if not PIPER_AVAILABLE:
             raise ImportError("Piper TTS not available. Please install with 'pip install piper-tts'.")
             
+        if config is None:
+            config = get_settings().tts
         self.model_path = config.model_path
         self.model_config_path = config.model_config_path
         self._sample_rate = 16000  # Default, will be updated when voice is loaded
@@ -146,6 +174,10 @@ class PiperTTSService(TTSService):
         """Get the sample rate of the synthesized audio."""
         return self._sample_rate
 
+    def is_ready(self) -> bool:
+        """Return True once the Piper voice has been loaded."""
+        return self.voice is not None
+
     def synthesize(self, text: str) -> bytes:
         """
         Synthesize text to speech using Piper and return the raw waveform bytes.
@@ -189,6 +221,31 @@ class PiperTTSService(TTSService):
             logging.error(f"Piper synthesis error: {str(e)}", exc_info=True)
             return b''
 
+    def synthesize_stream(self, text: str) -> Iterator[bytes]:
+        """
+        Synthesize text sentence by sentence, yielding raw PCM as each one finishes.
+        
+        Args:
+            text: Input text to synthesize
+            
+        Yields:
+            bytes: Raw audio data as 16-bit PCM
+        """
+        if not text or not text.strip():
+            logging.warning("Empty text provided to synthesize")
+            return
+        
+        if not self.voice:
+            logging.error("TTS voice not initialized")
+            return
+            
+        try:
+            logging.info(f"Streaming synthesis of text: '{text}'")
+            for chunk in self.voice.synthesize(text):
+                yield chunk.audio_int16_bytes
+        except Exception as e:
+            logging.error(f"Piper synthesis error: {str(e)}", exc_info=True)
+
     def get_audio_duration(self, audio_data: bytes) -> float:
         """
         Calculate the duration in seconds of the audio data.
@@ -207,12 +264,194 @@ class PiperTTSService(TTSService):
         duration = num_samples / self._sample_rate
         return duration
 
+# Size written into the RIFF and data chunks when the length isn't known up front
+# (streamed audio). Most players treat it as "read until end of stream".
+WAV_UNKNOWN_SIZE = 0xFFFFFFFF
+
+@functools.lru_cache(maxsize=None)
+def streaming_wav_header(sample_rate: int) -> bytes:
+    """Return the (cached) WAV header used for audio of unknown length."""
+    return wav_header(None, sample_rate)
+
+def wav_header(data_size: Optional[int], sample_rate: int, channels: int = 1, sample_width: int = 2) -> bytes:
+    """
+    Build the 44-byte RIFF/WAVE header for a block of PCM audio.
+    
+    Args:
+        data_size: Length of the PCM payload in bytes, or None if unknown (streaming)
+        sample_rate: Sample rate in Hz
+        channels: Number of interleaved channels
+        sample_width: Bytes per sample (2 for 16-bit PCM)
+        
+    Returns:
+        bytes: The WAV header, to be followed directly by the PCM data
+    """
+    block_align = channels * sample_width
+    if data_size is None:
+        riff_size = data_size = WAV_UNKNOWN_SIZE
+    else:
+        riff_size = 36 + data_size
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", riff_size, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, sample_width * 8,
+        b"data", data_size
+    )
+
+class LRUBytesCache:
+    """
+    Thread-safe LRU cache of bytes values bounded by total byte size.
+    
+    Entries are evicted least-recently-used first once the combined length of
+    the cached values exceeds max_bytes. Values larger than the whole budget
+    are never stored.
+    """
+    def __init__(self, max_bytes: int):
+        """
+        Initialize the cache.
+        
+        Args:
+            max_bytes: Maximum combined size of all cached values in bytes
+        """
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached value for key, or None on a miss."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: bytes) -> None:
+        """Store value under key, evicting old entries to stay within budget."""
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+class CachedTTSService(TTSService):
+    """
+    TTSService decorator that memoizes synthesized audio by text.
+    
+    Identical prompts skip the TTS model entirely and return the cached PCM
+    bytes. Keys are a sha256 of the stripped text, the voice model path and
+    the sample rate, so switching voices never serves stale audio.
+    """
+    def __init__(self, service: TTSService, max_bytes: Optional[int] = None):
+        """
+        Wrap an existing TTS service with a synthesis cache.
+        
+        Args:
+            service: The TTS service that performs the actual synthesis
+            max_bytes: Byte budget for cached PCM audio (default:
+                settings.tts.cache_max_bytes)
+        """
+        if max_bytes is None:
+            max_bytes = get_settings().tts.cache_max_bytes
+        self.service = service
+        self.cache = LRUBytesCache(max_bytes)
+        self._voice_id = getattr(service, "model_path", type(service).__name__)
+
+    @property
+    def sample_rate(self) -> int:
+        """Get the sample rate of the synthesized audio."""
+        return self.service.sample_rate
+
+    def is_ready(self) -> bool:
+        """Return True if the wrapped service is ready."""
+        return self.service.is_ready()
+
+    def cache_key(self, text: str) -> str:
+        """
+        Build the cache key for a piece of text.
+        
+        Args:
+            text: The input text
+            
+        Returns:
+            str: Hex sha256 digest of text, voice and sample rate
+        """
+        key = f"{text.strip()}|{self._voice_id}|{self.sample_rate}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def synthesize(self, text: str) -> bytes:
+        """
+        Synthesize text, returning cached audio when the same text was seen before.
+        
+        Args:
+            text: Input text to synthesize
+            
+        Returns:
+            bytes: Raw audio data as 16-bit PCM
+        """
+        if not text or not text.strip():
+            return self.service.synthesize(text)
+            
+        key = self.cache_key(text)
+        audio_bytes = self.cache.get(key)
+        if audio_bytes is not None:
+            logging.debug(f"TTS cache hit for text: '{text}'")
+            return audio_bytes
+            
+        audio_bytes = self.service.synthesize(text.strip())
+        # Don't cache failures so a transient error doesn't stick
+        if audio_bytes:
+            self.cache.put(key, audio_bytes)
+        return audio_bytes
+
+    def synthesize_stream(self, text: str) -> Iterator[bytes]:
+        """
+        Stream synthesized audio, serving cached audio in one chunk on a hit.
+        
+        On a miss the chunks are passed through as they arrive and the joined
+        result is cached once the stream completes.
+        
+        Args:
+            text: Input text to synthesize
+            
+        Yields:
+            bytes: Raw audio data as 16-bit PCM
+        """
+        if not text or not text.strip():
+            return
+            
+        key = self.cache_key(text)
+        audio_bytes = self.cache.get(key)
+        if audio_bytes is not None:
+            yield audio_bytes
+            return
+            
+        chunks = []
+        for chunk in self.service.synthesize_stream(text.strip()):
+            chunks.append(chunk)
+            yield chunk
+        if chunks:
+            self.cache.put(key, b"".join(chunks))
+
+    def get_audio_duration(self, audio_data: bytes) -> float:
+        """Calculate the duration in seconds of the audio data."""
+        return self.service.get_audio_duration(audio_data)
+
 # Singleton instance creation function
 def create_tts_service() -> TTSService:
     """Create and return a TTSService instance."""
     try:
         service = PiperTTSService()
         logging.info("Successfully initialized TTSService")
+        cache_max_bytes = get_settings().tts.cache_max_bytes
+        if cache_max_bytes > 0:
+            service = CachedTTSService(service, cache_max_bytes)
         return service
     except Exception as e:
         logging.critical(f"Failed to initialize TTSService: {e}", exc_info=True)
@@ -222,6 +461,9 @@ def create_tts_service() -> TTSService:
             def sample_rate(self) -> int:
                 return 16000
                 
+            def is_ready(self) -> bool:
+                return False
+                
             def synthesize(self, text: str) -> bytes:
                 logging.error("Using dummy TTS service - no audio will be generated")
                 return b''